@@ -0,0 +1,94 @@
+"""
+HTTP load against running servers: requests/sec and latency percentiles of
+company reads, with concurrent keep-alive clients. Compares the sync workers
+against the async app, on the same database.
+
+Start both servers, e.g. from the flask container:
+    gunicorn -w 4 --bind 0.0.0.0:8000 'src:app'
+    hypercorn --workers 4 --bind 0.0.0.0:8001 'src.asgi:app'
+
+Then:
+    python -m benchmarks.load --url http://localhost:8000 --url http://localhost:8001
+
+The company ids are read from the first server's listing, so seed some
+companies first (e.g. with `python -m benchmarks.search`). Clients are threads,
+run it from another machine or container than the servers for high rates.
+"""
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from json import loads
+from random import Random
+from statistics import quantiles
+from threading import Thread
+from time import perf_counter
+from typing import List
+from urllib.parse import urlsplit
+
+
+def company_ids(url: str, limit: int) -> List[int]:
+    connection = HTTPConnection(urlsplit(url).netloc)
+    connection.request('GET', f'/company/?limit={limit}')
+    results = loads(connection.getresponse().read())['results']
+    connection.close()
+
+    return [company['id'] for company in results]
+
+
+def client(url: str, paths: List[str], seconds: float, seed: int, latencies: List[float], errors: List[int]):
+    random = Random(seed)
+    connection = HTTPConnection(urlsplit(url).netloc)
+
+    deadline = perf_counter() + seconds
+    while perf_counter() < deadline:
+        started = perf_counter()
+        connection.request('GET', random.choice(paths))
+        response = connection.getresponse()
+        response.read()
+        latencies.append(perf_counter() - started)
+
+        if response.status >= 400:
+            errors.append(response.status)
+
+    connection.close()
+
+
+def run(url: str, paths: List[str], concurrency: int, seconds: float):
+    latencies, errors = [], []
+    threads = [
+        Thread(target=client, args=(url, paths, seconds, seed, latencies, errors))
+        for seed in range(concurrency)
+    ]
+
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - started
+
+    percentiles = quantiles(latencies, n=100)
+    print(
+        f'{url:>28}: {len(latencies) / elapsed:9.1f} req/s'
+        f' p50 {percentiles[49] * 1e3:7.2f} ms'
+        f' p99 {percentiles[98] * 1e3:7.2f} ms'
+        f' {len(errors)} errors'
+    )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', action='append', required=True, help='Server to load, repeatable.')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--companies', type=int, default=500, help='Distinct companies to read.')
+    arguments = parser.parse_args()
+
+    ids = company_ids(arguments.url[0], arguments.companies)
+    paths = [f'/company/{company_id}' for company_id in ids] + ['/company/?limit=20']
+
+    for url in arguments.url:
+        run(url, paths, arguments.concurrency, arguments.seconds)
+
+
+if __name__ == '__main__':
+    main()
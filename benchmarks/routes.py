@@ -0,0 +1,216 @@
+"""
+Throughput and latency of every company route, in process through the test
+client, on a seeded database. Results are written as JSON, and compared to a
+saved baseline: the exit code is 1 when a route's median latency regressed
+beyond the threshold.
+
+It drops, creates and seeds the tables of the given database, so point it to a
+scratch one. SQLite or Postgres.
+
+Usage, from the flask container:
+    python -m benchmarks.routes --database-uri sqlite:////tmp/bench.db --output results.json
+    python -m benchmarks.routes --database-uri sqlite:////tmp/bench.db --baseline results.json
+"""
+import sys
+from argparse import ArgumentParser
+from decimal import Decimal
+from json import dump, load
+from os import environ
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Config
+from sqlalchemy import insert, select
+
+from src import create_app
+from src.database.db import db
+from src.database.models import Bank, ClientCompany, CompanyBankAccount
+from src.tests.data.banks import bank_list
+
+Request = Tuple[str, str, Optional[object]]
+"""
+Method, path and JSON body of a request.
+"""
+
+
+def seed(companies: int, accounts: int) -> Tuple[List[int], List[int]]:
+    """
+    Returns the ids of the companies and of their accounts.
+    """
+    db.drop_all()
+    db.create_all()
+    db.session.add_all([Bank(**bank) for bank in bank_list])
+    db.session.execute(insert(ClientCompany), [
+        {
+            'company_name': f'company {i}',
+            'phone': f'55{i:09d}',
+            'declared_billing': Decimal('1235.69'),
+        }
+        for i in range(companies)
+    ])
+    company_ids = db.session.scalars(select(ClientCompany.id).order_by(ClientCompany.id)).all()
+    db.session.execute(insert(CompanyBankAccount), [
+        {
+            'company_id': company_id,
+            'agency': '0001',
+            'account_number': str(j),
+            'bank_code': bank_list[j % len(bank_list)]['code'],
+        }
+        for company_id in company_ids
+        for j in range(accounts)
+    ])
+    db.session.commit()
+
+    account_ids = db.session.scalars(
+        select(CompanyBankAccount.id).order_by(CompanyBankAccount.id)
+    ).all()
+    db.session.remove()
+
+    return company_ids, account_ids
+
+
+def company_body(i: int) -> Dict:
+    return {
+        'company_name': f'benchmark company {i}',
+        'phone': f'55{i:09d}',
+        'declared_billing': 1235.69,
+        'bank_accounts': [{'agency': '0001', 'account_number': str(i), 'bank_code': '237'}],
+    }
+
+
+def routes(
+    company_ids: List[int], account_ids: List[int], accounts: int, number: int
+) -> Dict[str, Callable[[int], Request]]:
+    """
+    Request of the i-th call to each route. Routes that remove rows run on rows
+    no other route uses: deletes run last and each deletes a different row, and
+    accounts are synced on the companies deleted at the end.
+    """
+    random = Random(42)
+    readable = company_ids[:-number]
+    deleted_companies = company_ids[-number:]
+    deleted_accounts = account_ids[:number]
+    # Accounts are seeded in company order, skip the deleted and synced ones.
+    updated_accounts = account_ids[number:len(account_ids) - number * accounts]
+
+    return {
+        'get_company': lambda i: ('get', f'/company/{random.choice(readable)}', None),
+        'list_companies': lambda i: ('get', f'/company/?limit=50&cursor={random.choice(readable)}', None),
+        'search_companies': lambda i: ('get', f'/company/search?q=company {random.randrange(100)}', None),
+        'create_company': lambda i: ('post', '/company/', company_body(i)),
+        'bulk_create_companies': lambda i: (
+            'post', '/company/bulk', [company_body(i * 100 + j) for j in range(100)]
+        ),
+        'update_company': lambda i: (
+            'put', f'/company/{random.choice(readable)}', {'company_name': f'updated company {i}'}
+        ),
+        'sync_company_accounts': lambda i: (
+            'put',
+            f'/company/{deleted_companies[i]}?sync_accounts=true',
+            {'bank_accounts': [{'agency': '0001', 'account_number': str(i), 'bank_code': '237'}]},
+        ),
+        'add_bank_account': lambda i: (
+            'post',
+            f'/company/{random.choice(readable)}/bank_account',
+            {'agency': '0002', 'account_number': str(i), 'bank_code': '044'},
+        ),
+        'update_bank_account': lambda i: (
+            'put', f'/company/account/{random.choice(updated_accounts)}', {'agency': str(i)}
+        ),
+        'delete_bank_account': lambda i: ('delete', f'/company/account/{deleted_accounts[i]}', None),
+        'delete_company': lambda i: ('delete', f'/company/{deleted_companies[i]}', None),
+    }
+
+
+def measure(client, request: Callable[[int], Request], number: int) -> Dict:
+    latencies = []
+    for i in range(number):
+        method, path, body = request(i)
+
+        started = perf_counter()
+        response = getattr(client, method)(path, json=body)
+        latencies.append(perf_counter() - started)
+
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method.upper()} {path}: {response.status_code} {response.data[:200]}')
+
+    percentiles = quantiles(latencies, n=100)
+    return {
+        'requests': number,
+        'requests_per_second': number / sum(latencies),
+        'mean_ms': mean(latencies) * 1e3,
+        'p50_ms': percentiles[49] * 1e3,
+        'p99_ms': percentiles[98] * 1e3,
+    }
+
+
+def regressions(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Routes whose median latency is over the baseline's by more than the
+    threshold, e.g. 0.2 for 20%.
+    """
+    return [
+        f'{name}: p50 {result["p50_ms"]:.2f} ms, baseline {baseline["routes"][name]["p50_ms"]:.2f} ms'
+        for name, result in results['routes'].items()
+        if name in baseline['routes']
+        and result['p50_ms'] > baseline['routes'][name]['p50_ms'] * (1 + threshold)
+    ]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-uri', required=True)
+    parser.add_argument('--settings', default=environ.get('SETTINGS_MODULE'))
+    parser.add_argument('--companies', type=int, default=10000)
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--number', type=int, default=200, help='Requests per route.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Results JSON file to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    arguments = parser.parse_args()
+
+    config = Config('.')
+    if arguments.settings:
+        config.from_pyfile(arguments.settings)
+    config.update(
+        SQLALCHEMY_DATABASE_URI=arguments.database_uri,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        PROFILING_ENABLED=False,
+    )
+    app = create_app(dict(config))
+
+    with app.app_context():
+        company_ids, account_ids = seed(arguments.companies, arguments.accounts)
+
+    client = app.test_client()
+    results = {
+        'database': arguments.database_uri.split(':')[0],
+        'companies': arguments.companies,
+        'accounts': arguments.accounts,
+        'routes': {},
+    }
+    for name, request in routes(company_ids, account_ids, arguments.accounts, arguments.number).items():
+        results['routes'][name] = result = measure(client, request, arguments.number)
+        print(
+            f'{name:>22}: {result["requests_per_second"]:9.1f} req/s'
+            f' p50 {result["p50_ms"]:7.2f} ms p99 {result["p99_ms"]:7.2f} ms'
+        )
+
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            dump(results, f, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            regressed = regressions(results, load(f), arguments.threshold)
+
+        for regression in regressed:
+            print(f'regression: {regression}')
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
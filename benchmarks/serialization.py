@@ -0,0 +1,98 @@
+"""
+Company read path: ORM models + serialize() + default JSON provider, against the
+Core projection + FastJSONProvider. Prints time and peak memory per page.
+
+It creates the tables and seeds companies in the given database, so point it to
+a scratch one.
+
+Usage, from the flask container:
+    python -m benchmarks.serialization --database-uri sqlite:////tmp/bench.db
+"""
+from argparse import ArgumentParser
+from decimal import Decimal
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from flask.json.provider import DefaultJSONProvider
+
+from src import create_app
+from src.database.db import db
+from src.database.models import Bank, ClientCompany, CompanyBankAccount
+from src.database.projections import company_page
+from src.json_provider import FastJSONProvider
+from src.tests.data.banks import bank_list
+
+app = create_app()
+
+
+def seed(companies: int, accounts: int):
+    db.drop_all()
+    db.create_all()
+    db.session.add_all([Bank(**bank) for bank in bank_list])
+    db.session.add_all([
+        ClientCompany(
+            company_name=f'company {i}',
+            phone='11978235674',
+            declared_billing=Decimal('1235.69'),
+            bank_accounts=[
+                CompanyBankAccount(
+                    agency='0001', account_number=str(j), bank_code=bank_list[j % len(bank_list)]['code']
+                )
+                for j in range(accounts)
+            ],
+        )
+        for i in range(companies)
+    ])
+    db.session.commit()
+
+
+def orm_page(limit: int) -> str:
+    companies, _ = ClientCompany.list_page(None, limit)
+
+    return DefaultJSONProvider(app).dumps([company.serialize() for company in companies])
+
+
+def projection_page(limit: int) -> str:
+    documents, _ = company_page(None, limit)
+    return FastJSONProvider(app).dumps(documents)
+
+
+def measure(func, limit: int, number: int):
+    db.session.remove()
+    func(limit)
+
+    elapsed = 0.0
+    for _ in range(number):
+        db.session.remove()
+        started = perf_counter()
+        func(limit)
+        elapsed += perf_counter() - started
+
+    db.session.remove()
+    start()
+    func(limit)
+    _, peak = get_traced_memory()
+    stop()
+
+    return elapsed / number, peak
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-uri', required=True)
+    parser.add_argument('--companies', type=int, default=500)
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    arguments = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = arguments.database_uri
+    with app.app_context():
+        seed(arguments.companies, arguments.accounts)
+
+        for name, func in [('orm', orm_page), ('projection', projection_page)]:
+            seconds, peak = measure(func, arguments.companies, arguments.number)
+            print(f'{name:>10}: {seconds * 1e3:8.2f} ms/page {peak / 1024:10.1f} KiB peak')
+
+
+if __name__ == '__main__':
+    main()
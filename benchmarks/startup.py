@@ -0,0 +1,96 @@
+"""
+Startup time and per worker memory of the gunicorn sync workers, with and
+without --preload. Starts gunicorn, waits until /health has been answered by
+every worker, then reads the RSS and PSS of the master and the workers from
+/proc (Linux only). PSS splits the pages shared copy-on-write between the
+processes sharing them, so it shows what preloading saves.
+
+Usage, from the flask container:
+    python -m benchmarks.startup --workers 4
+"""
+from argparse import ArgumentParser
+from json import loads
+from subprocess import Popen
+from time import perf_counter, sleep
+from typing import Dict, List
+from urllib.error import URLError
+from urllib.request import urlopen
+
+
+def children(pid: int) -> List[int]:
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def memory_kib(pid: int) -> Dict[str, int]:
+    """
+    Rss and Pss of the process, in KiB.
+    """
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key] = int(value.split()[0])
+
+    return memory
+
+
+def wait_for_workers(url: str, workers: int, timeout: float) -> float:
+    """
+    Seconds until /health was answered by `workers` different processes.
+    """
+    started = perf_counter()
+    pids = set()
+    while len(pids) < workers:
+        if perf_counter() - started > timeout:
+            raise TimeoutError(f'Only {len(pids)} workers answered')
+
+        try:
+            with urlopen(url, timeout=1) as response:
+                pids.add(loads(response.read())['pid'])
+        except (URLError, ConnectionError):
+            sleep(0.01)
+
+    return perf_counter() - started
+
+
+def measure(preload: bool, workers: int, port: int, timeout: float):
+    command = [
+        'gunicorn', '--config', 'gunicorn.conf.py',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+    ]
+    if preload:
+        command.append('--preload')
+
+    master = Popen(command)
+    try:
+        seconds = wait_for_workers(f'http://127.0.0.1:{port}/health', workers, timeout)
+        memories = [memory_kib(pid) for pid in children(master.pid)]
+        master_memory = memory_kib(master.pid)
+    finally:
+        master.terminate()
+        master.wait()
+
+    name = 'preload' if preload else 'no preload'
+    print(
+        f'{name:>10}: {seconds:6.2f} s to serve'
+        f' | master rss {master_memory["Rss"] / 1024:6.1f} MiB'
+        f' | per worker rss {sum(m["Rss"] for m in memories) / len(memories) / 1024:6.1f} MiB'
+        f' pss {sum(m["Pss"] for m in memories) / len(memories) / 1024:6.1f} MiB'
+    )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--timeout', type=float, default=60)
+    arguments = parser.parse_args()
+
+    for preload in (False, True):
+        measure(preload, arguments.workers, arguments.port, arguments.timeout)
+
+
+if __name__ == '__main__':
+    main()
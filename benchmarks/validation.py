@@ -0,0 +1,76 @@
+"""
+Per request overhead of validate_request_body.
+
+Before: a new schema per request, the loaded values thrown away and the view
+reading the raw request.json again. After: one schema per decorator, the body
+parsed and loaded once and given to the view.
+
+Usage, from the flask container:
+    python -m benchmarks.validation --number 20000
+"""
+from argparse import ArgumentParser
+from timeit import repeat
+
+from flask import request
+
+from src import create_app
+from src.blueprints.company.validator import CompanyRequest, validate_request_body
+
+app = create_app()
+
+REQUEST_BODY = {
+    'company_name': 'My Company',
+    'phone': '11978235674',
+    'declared_billing': 123.02,
+    'bank_accounts': [
+        {'account_number': str(i), 'agency': '0001', 'bank_code': '044'} for i in range(5)
+    ],
+}
+
+
+def validate_request_body_before(schema):
+    """
+    validate_request_body as it was, kept here only to compare.
+    """
+    def validate_decorator(func):
+        def wrapper(*args, **kwargs):
+            schema().load(request.json)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return validate_decorator
+
+
+@validate_request_body_before(schema=CompanyRequest)
+def view_before():
+    return request.json
+
+
+@validate_request_body(schema=CompanyRequest)
+def view_after(body):
+    return body
+
+
+def per_call(view, number: int) -> float:
+    # A request context per call, so the body is parsed again like on a request.
+    def call():
+        with app.test_request_context(json=REQUEST_BODY):
+            view()
+
+    return min(repeat(call, number=number, repeat=5)) / number
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=10000)
+    number = parser.parse_args().number
+
+    before, after = per_call(view_before, number), per_call(view_after, number)
+    print(f'before: {before * 1e6:8.2f} us/request')
+    print(f'after:  {after * 1e6:8.2f} us/request')
+    print(f'speedup: {before / after:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
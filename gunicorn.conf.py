@@ -0,0 +1,45 @@
+"""
+Gunicorn settings of the production sync workers, see docker/production/flask/start.
+
+With --preload, as start runs it, the app is built once in the master and the
+workers are forked from it, sharing its memory copy-on-write instead of
+importing everything again. Building the app doesn't connect to the database,
+and post_fork drops any pooled connection a worker inherits anyway.
+
+Workers write their Prometheus metrics to PROMETHEUS_MULTIPROC_DIR, set here
+before the app is imported, see src/metrics.py.
+"""
+from glob import glob
+from os import environ, getpid, makedirs, remove
+from os.path import join
+
+wsgi_app = 'src:create_app()'
+bind = '0.0.0.0:8000'
+workers = 4
+# Over 1, each worker serves requests from that many threads, which
+# GROUP_COMMIT_ENABLED needs to group the creates of concurrent requests.
+threads = int(environ.get('GUNICORN_THREADS', 1))
+
+# Before --preload imports the app, whose metrics open their files in it.
+environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+makedirs(environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def on_starting(server):
+    # Files of the workers of a previous run would be summed with the new ones.
+    for path in glob(join(environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+        if not path.endswith(f'_{getpid()}.db'):
+            remove(path)
+
+
+def post_fork(server, worker):
+    from src.database.db import dispose_engine
+
+    dispose_engine(server.app.wsgi())
+
+
+def child_exit(server, worker):
+    # Drops the gauges of the worker, its counters and histograms are kept.
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,25 +1,81 @@
 from os import environ
-from flask import Flask
+from typing import Dict, Optional, Union
 
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+
+from src import metrics, profiling
 from src.database.db import init_from_app
-from src.exceptions import InvalidException, handle_bad_request
+from src.exceptions import handle_bad_request
+from src.json_provider import FastJSONProvider
+
+
+def create_app(config: Optional[Union[str, Dict]] = None) -> Flask:
+    """
+    Builds the app from a settings file path, a dict of settings, or by
+    default the SETTINGS_MODULE environment variable.
+
+    Nothing here connects to the database, so the app can be built in the
+    gunicorn master and forked (--preload, see gunicorn.conf.py): the engine and
+    the caches connect and load on first use, in each worker.
+    """
+    app = Flask(__name__)
+    if config is None:
+        config = environ['SETTINGS_MODULE']
+    if isinstance(config, str):
+        app.config.from_pyfile(config)
+    else:
+        app.config.from_mapping(config)
+    app.json = FastJSONProvider(app)
+
+    # Database related
+    init_from_app(app)
+
+    from src.database.cache import bank_cache, company_cache
+    bank_cache.init_app(app)
+    company_cache.init_app(app)
+
+    from src.database.group_commit import group_committer
+    group_committer.init_app(app)
+
+    from src.database.sharding import shards
+    shards.init_app(app)
+
+    # Server-Timing and slow query log, when PROFILING_ENABLED
+    profiling.init_app(app)
+
+    # Prometheus /metrics of every worker, when METRICS_ENABLED
+    metrics.init_app(app)
+
+    # Error handling related
+    app.register_error_handler(400, handle_bad_request)
+
+    register_blueprints(app)
+
+    # Shell related
+    app.cli.add_command(shell_plus)
+    app.cli.add_command(pool_stats)
+    app.cli.add_command(import_companies)
+    app.cli.add_command(rebuild_billing_summary)
 
-app = Flask(__name__)
-app.config.from_pyfile(environ['SETTINGS_MODULE'])
+    return app
 
-# Database related
-init_from_app(app)
 
-# Error handling related
-app.register_error_handler(400, handle_bad_request)
+def register_blueprints(app: Flask):
+    """
+    The views are imported here, not when src is imported, so importing the
+    package or the models doesn't pull them in.
+    """
+    from src.blueprints.company import blueprint as user_blueprint
+    app.register_blueprint(user_blueprint, url_prefix='/company')
 
-# Blueprints related
-from src.blueprints.company import blueprint as user_blueprint
-app.register_blueprint(user_blueprint, url_prefix='/company')
+    from src.blueprints.health import blueprint as health_blueprint
+    app.register_blueprint(health_blueprint)
 
 
-# Shell related
-@app.cli.command('shell_plus')
+@click.command('shell_plus')
+@with_appcontext
 def shell_plus():
     from IPython import embed
     from src.database.models import (
@@ -29,9 +85,75 @@ def shell_plus():
 
     embed(
         user_ns={
-            'app': app,
+            'app': current_app._get_current_object(),
             'Bank': Bank,
             'CompanyBankAccount': CompanyBankAccount,
             'ClientCompany': ClientCompany,
             'db': db
         })
+
+
+@click.command('pool_stats')
+@click.option('--url', help='Workers /health URL, e.g. http://nginx/health')
+@click.option('--samples', default=50, help='Requests to /health to reach every worker.')
+@with_appcontext
+def pool_stats(url, samples):
+    """
+    Configured pool limits and, with --url, the pool counters of the running
+    workers. Each /health request is answered by one worker, so it is sampled
+    until every worker is seen, then summed.
+    """
+    from json import dumps, loads
+    from urllib.request import urlopen
+    from src.database.pool import aggregate_worker_status
+
+    print(dumps({'configured': current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}, indent=2))
+    if not url:
+        return
+
+    statuses = []
+    for _ in range(samples):
+        with urlopen(url) as response:
+            statuses.append(loads(response.read()))
+
+    print(dumps({'workers': aggregate_worker_status(statuses)}, indent=2))
+
+
+@click.command('import-companies')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']), help='By default, from the extension.')
+@click.option('--chunk-size', type=int, help='Companies per transaction, COMPANY_IMPORT_CHUNK_SIZE by default.')
+@click.option('--checkpoint', help='Resume file, PATH.checkpoint by default.')
+@click.option('--errors', help='Rejected records file, PATH.errors by default.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and import from the start.')
+@with_appcontext
+def import_companies(path, file_format, chunk_size, checkpoint, errors, restart):
+    """
+    Imports companies, their bank accounts and banks from an NDJSON or CSV
+    file, in the layouts of GET /company/export. See src/importer.py.
+    """
+    from src.importer import import_file
+
+    stats = import_file(
+        path,
+        file_format or ('csv' if path.endswith('.csv') else 'ndjson'),
+        chunk_size or current_app.config.get('COMPANY_IMPORT_CHUNK_SIZE', 10000),
+        checkpoint or f'{path}.checkpoint',
+        errors or f'{path}.errors',
+        restart=restart,
+        progress=click.echo,
+    )
+    click.echo(f'{stats.imported} imported, {stats.failed} failed')
+
+
+@click.command('rebuild-billing-summary')
+@with_appcontext
+def rebuild_billing_summary():
+    """
+    Recomputes the per bank billing summary of GET /company/stats from every
+    company, after creating its table or writing companies outside the app.
+    """
+    from src.database.models import BankBillingSummary
+
+    BankBillingSummary.rebuild()
+    click.echo(f'{len(BankBillingSummary.totals())} banks summarized')
@@ -0,0 +1,368 @@
+"""
+ASGI entry point. Serves the company and bank account routes of
+src.blueprints.company with Quart on an async engine, so a worker keeps serving
+other requests while it waits on the database. Models, schemas and the
+company projection are the same as the sync app's.
+
+Run with:
+    hypercorn --workers 4 --bind 0.0.0.0:8000 'src.asgi:app'
+"""
+import asyncio
+from math import ceil
+from os import environ
+from typing import Dict, List
+
+from marshmallow import Schema, ValidationError
+from quart import Blueprint, Quart, abort, current_app, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from src.blueprints.company.validator import (
+    BankRequest, CompanyChangesArgs, CompanyDocumentArgs, CompanyListRequest, CompanyRequest,
+    CompanySearchRequest, CompanyUpdateArgs
+)
+from src.blueprints.company.views import document_cache_key, document_etag
+from src.database.async_db import async_db
+from src.database.cache import AsyncBankCache, company_cache
+from src.database.models import (
+    BankBillingSummary, ClientCompany, CompanyBankAccount, CompanyChange, is_unique_violation
+)
+from src.database.projections import (
+    company_documents, company_documents_select, company_page_ids_select, split_page
+)
+from src.exceptions import InvalidException, InvalidRequestSchemaError, handle_bad_request
+from src.json_provider import FastJSONProvider
+
+blueprint = Blueprint('company', __name__)
+
+bank_cache = AsyncBankCache()
+
+company_loader = CompanyRequest()
+document_loader = CompanyDocumentArgs()
+bank_account_loader = BankRequest()
+list_loader = CompanyListRequest()
+search_loader = CompanySearchRequest()
+update_args_loader = CompanyUpdateArgs()
+changes_loader = CompanyChangesArgs()
+
+
+async def load_body(loader: Schema) -> Dict:
+    try:
+        return loader.load(await request.get_json())
+    except ValidationError as e:
+        # HTTP safe error.
+        raise InvalidRequestSchemaError(str(e))
+
+
+def load_args(loader: Schema) -> Dict:
+    try:
+        return loader.load(request.args)
+    except ValidationError as e:
+        # HTTP safe error.
+        raise InvalidRequestSchemaError(str(e))
+
+
+async def commit_unique(session, message: str):
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if is_unique_violation(e):
+            raise InvalidException(message)
+        raise
+
+
+async def apply_billing_changes(session, changes):
+    for statement, parameters in BankBillingSummary.changes_statements(changes, async_db.engine.dialect.name):
+        await session.execute(statement, parameters)
+
+
+async def apply_billing_update(session, company_id: int, updated):
+    """
+    BankBillingSummary.apply_update() on the async session.
+    """
+    states = BankBillingSummary.states_from_rows(
+        await session.execute(BankBillingSummary.states_select([company_id]))
+    )
+    if company_id in states:
+        before = states[company_id]
+        await apply_billing_changes(session, [(before, updated(before))])
+
+
+async def record_change(session, operation: str, company_ids: List[int]):
+    """
+    CompanyChange.record() on the async session.
+    """
+    for statement, parameters in CompanyChange.record_statements(
+        operation, company_ids, async_db.engine.dialect.name
+    ):
+        await session.execute(statement, parameters)
+
+
+async def company_page(session, params: Dict, *criteria) -> Dict:
+    limit = min(
+        params.get('limit', current_app.config.get('COMPANY_PAGE_SIZE', 50)),
+        current_app.config.get('COMPANY_PAGE_SIZE_MAX', 500),
+    )
+    page_ids = company_page_ids_select(params.get('cursor'), limit, *criteria)
+
+    fields, embed_accounts = params['document_fields'], params['embed_accounts']
+
+    await bank_cache.refresh(session)
+    rows = await session.execute(company_documents_select(
+        ClientCompany.id.in_(page_ids), fields=fields, embed_accounts=embed_accounts
+    ))
+    documents, next_cursor = split_page(
+        company_documents(rows, fields, embed_accounts, banks=bank_cache), limit
+    )
+
+    return {
+        'results': documents,
+        'next_cursor': next_cursor,
+    }
+
+
+# Company Routes
+@blueprint.get('/<int:company_id>')
+async def company_get(company_id):
+    """
+    Same caching as the sync route: the cached document is served while its
+    version is still the one in the database.
+    """
+    params = load_args(document_loader)
+    fields, embed_accounts = params['document_fields'], params['embed_accounts']
+    cache_key = document_cache_key(company_id, fields, embed_accounts)
+
+    async with async_db.session() as session:
+        cached = company_cache.get(cache_key)
+        if cached is not None and cached[2] != await session.scalar(
+            select(ClientCompany.version).where(ClientCompany.id == company_id)
+        ):
+            cached = None
+
+        if cached is not None:
+            etag, body, _ = cached
+        else:
+            await bank_cache.refresh(session)
+            rows = (await session.execute(company_documents_select(
+                ClientCompany.id == company_id, fields=fields, embed_accounts=embed_accounts
+            ))).all()
+            if not rows:
+                abort(404, description='Invalid Company')
+
+            document = company_documents(rows, fields, embed_accounts, banks=bank_cache)[0]
+            body = current_app.json.dumps(document)
+            etag = document_etag(company_id, rows[0].version, fields, embed_accounts)
+            company_cache.set(cache_key, etag, body, rows[0].version)
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+
+    response.set_etag(etag)
+    return response
+
+
+@blueprint.get('/')
+async def company_list():
+    params = load_args(list_loader)
+
+    async with async_db.session() as session:
+        return await company_page(session, params)
+
+
+@blueprint.get('/search')
+async def company_search():
+    params = load_args(search_loader)
+
+    async with async_db.session() as session:
+        return await company_page(session, params, ClientCompany.search_criteria(params['q']))
+
+
+@blueprint.get('/changes')
+async def company_changes():
+    """
+    See the sync app's company_changes(). Waiting doesn't hold a worker.
+    """
+    params = load_args(changes_loader)
+    since = params['since']
+    limit = min(
+        params.get('limit', current_app.config.get('CHANGE_FEED_PAGE_SIZE', 100)),
+        current_app.config.get('CHANGE_FEED_PAGE_SIZE_MAX', 1000),
+    )
+    wait = min(params['wait'], current_app.config.get('CHANGE_FEED_MAX_WAIT_SECONDS', 30))
+    poll_seconds = current_app.config.get('CHANGE_FEED_POLL_SECONDS', 0.5)
+
+    for attempt in range(ceil(wait / poll_seconds) + 1):
+        if attempt:
+            await asyncio.sleep(poll_seconds)
+
+        async with async_db.session() as session:
+            changes = CompanyChange.serialize_rows(await session.execute(CompanyChange.since_select(since, limit)))
+        if changes:
+            break
+
+    return {
+        'changes': changes,
+        'next_since': changes[-1]['seq'] if changes else since,
+    }
+
+
+@blueprint.post('/')
+async def company_post():
+    body = await load_body(company_loader)
+
+    async with async_db.session() as session:
+        await apply_billing_changes(session, [(None, BankBillingSummary.state_of(body))])
+        company = ClientCompany.build_from_dict(body)
+        session.add(company)
+        await session.flush()
+        await record_change(session, 'create', [company.id])
+        await session.commit()
+
+    return ''
+
+
+@blueprint.delete('/<int:company_id>')
+async def company_delete(company_id):
+    async with async_db.session() as session:
+        states = BankBillingSummary.states_from_rows(
+            await session.execute(BankBillingSummary.states_select([company_id]))
+        )
+        await apply_billing_changes(session, [(state, None) for state in states.values()])
+        await record_change(session, 'delete', list(states))
+        result = await session.execute(ClientCompany.delete_many_statement([company_id]))
+        await session.commit()
+
+    if not result.rowcount:
+        abort(404)
+
+    company_cache.invalidate(company_id)
+    return ''
+
+
+@blueprint.put('/<int:company_id>')
+async def company_update(company_id):
+    params = load_args(update_args_loader)
+    body = await load_body(company_loader)
+    sync_accounts = params['sync_accounts'] and 'bank_accounts' in body
+
+    async with async_db.session() as session:
+        company = await session.get(
+            ClientCompany,
+            company_id,
+            options=[] if sync_accounts else [selectinload(ClientCompany.bank_accounts)],
+        )
+        if company is None:
+            abort(404)
+
+        if 'declared_billing' in body or body.get('bank_accounts') or sync_accounts:
+            await apply_billing_update(
+                session, company_id, lambda before: BankBillingSummary.updated_state(before, body, sync_accounts)
+            )
+
+        if sync_accounts:
+            stored_rows = await session.execute(ClientCompany.stored_accounts_select(company_id))
+            for statement, parameters in ClientCompany.sync_accounts_statements(
+                company_id, stored_rows, body.pop('bank_accounts') or []
+            ):
+                await session.execute(statement, parameters)
+
+        company.apply_dict(body)
+        await record_change(session, 'update', [company_id])
+        await commit_unique(session, 'Account already registered.')
+
+    company_cache.invalidate(company_id)
+    return ''
+
+
+# Bank Model Routes
+@blueprint.post('/<int:company_id>/bank_account')
+async def add_bank_account(company_id):
+    body = await load_body(bank_account_loader)
+
+    async with async_db.session() as session:
+        if await session.get(ClientCompany, company_id) is None:
+            abort(404)
+
+        await apply_billing_update(
+            session, company_id, lambda before: BankBillingSummary.moved_state(before, None, body.get('bank_code'))
+        )
+        session.add(CompanyBankAccount(company_id=company_id, **body))
+        await session.execute(ClientCompany.version_bump(ClientCompany.id == company_id))
+        await record_change(session, 'update', [company_id])
+        await commit_unique(session, 'Account already registered.')
+
+    company_cache.invalidate(company_id)
+    return ''
+
+
+@blueprint.put('/account/<int:account_id>')
+async def update_bank_account(account_id):
+    body = await load_body(bank_account_loader)
+
+    async with async_db.session() as session:
+        bank_account = await session.get(CompanyBankAccount, account_id)
+        if bank_account is None:
+            abort(404)
+
+        company_id = bank_account.company_id
+        removed_code, added_code = bank_account.bank_code, body.get('bank_code', bank_account.bank_code)
+        if added_code != removed_code:
+            await apply_billing_update(
+                session, company_id, lambda before: BankBillingSummary.moved_state(before, removed_code, added_code)
+            )
+
+        for key, value in body.items():
+            setattr(bank_account, key, value)
+
+        await session.execute(ClientCompany.version_bump(ClientCompany.id == company_id))
+        await record_change(session, 'update', [company_id])
+        await commit_unique(session, 'Account already registered.')
+
+    company_cache.invalidate(company_id)
+    return ''
+
+
+@blueprint.delete('/account/<int:account_id>')
+async def delete_bank_account(account_id):
+    async with async_db.session() as session:
+        bank_account = await session.get(CompanyBankAccount, account_id)
+        if bank_account is None:
+            abort(404)
+
+        company_id = bank_account.company_id
+        await apply_billing_update(
+            session, company_id, lambda before: BankBillingSummary.moved_state(before, bank_account.bank_code, None)
+        )
+        await session.delete(bank_account)
+        await session.execute(ClientCompany.version_bump(ClientCompany.id == company_id))
+        await record_change(session, 'update', [company_id])
+        await session.commit()
+
+    company_cache.invalidate(company_id)
+    return ''
+
+
+app = Quart(__name__)
+app.config.from_pyfile(environ['SETTINGS_MODULE'])
+app.json = FastJSONProvider(app)
+
+# Database related
+async_db.init_app(app)
+bank_cache.ttl = app.config.get('BANK_CACHE_TTL', bank_cache.ttl)
+company_cache.init_app(app)
+
+
+@app.after_serving
+async def dispose_engine():
+    await async_db.dispose()
+
+
+# Error handling related
+app.register_error_handler(400, handle_bad_request)
+
+# Blueprints related
+app.register_blueprint(blueprint, url_prefix='/company')
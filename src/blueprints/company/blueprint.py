@@ -1,3 +1,15 @@
-from flask import Blueprint
+from flask import Blueprint, request
+
+from src.database.db import use_replica
 
 blueprint = Blueprint('user', __name__)
+
+
+@blueprint.before_request
+def read_from_replica():
+    """
+    GET routes only read, so they read from the replica when there's one, see
+    ReplicaRouter.
+    """
+    if request.method in ('GET', 'HEAD'):
+        use_replica()
@@ -1,7 +1,9 @@
-from typing import Type
+from typing import Dict, List, Optional, Tuple, Type
 from flask import request
-from marshmallow import Schema, fields, validate, ValidationError
+from marshmallow import EXCLUDE, Schema, fields, validate, ValidationError, post_load, validates_schema
+from src.database.projections import COMPANY_FIELDS
 from src.exceptions import InvalidRequestSchemaError
+from src.profiling import timed
 
 
 class CompanyBankAccount(Schema):
@@ -18,11 +20,104 @@ class CompanyRequest(Schema):
     Validate request to create/update company
     """
     company_name = fields.String()
-    phone = fields.Integer()
+    phone = fields.String(validate=[validate.Regexp(r'^\d+$'), validate.Length(max=15)])
     declared_billing = fields.Decimal()
     bank_accounts = fields.List(fields.Nested(CompanyBankAccount()))
 
 
+def require(data: Dict, *names: str):
+    missing = [name for name in names if data.get(name) is None]
+    if missing:
+        raise ValidationError({name: ['Missing data for required field.'] for name in missing})
+
+
+class BankReference(Schema):
+    code = fields.String(required=True, validate=validate.Length(min=1, max=3))
+    name = fields.String(required=True, validate=validate.Length(min=1, max=50))
+
+
+class CompanyImportBankAccount(CompanyBankAccount):
+    """
+    Bank account of an imported company. The bank is given by bank_code, or
+    as {code, name} like in GET /company/export, and is then created or
+    renamed too.
+    """
+    class Meta:
+        unknown = EXCLUDE
+
+    bank = fields.Nested(BankReference())
+
+    @validates_schema
+    def validate_complete(self, data, **kwargs):
+        require(data, 'agency', 'account_number')
+        if 'bank' not in data:
+            require(data, 'bank_code')
+
+    @post_load
+    def bank_code_of_bank(self, data, **kwargs):
+        if 'bank' in data:
+            data['bank_code'] = data['bank']['code']
+        return data
+
+
+class CompanyImportRecord(CompanyRequest):
+    """
+    Validate a company of `flask import-companies`: a create request, or a
+    document of GET /company/export, whose ids and dates are ignored.
+    """
+    class Meta:
+        unknown = EXCLUDE
+
+    bank_accounts = fields.List(fields.Nested(CompanyImportBankAccount()))
+
+    @validates_schema
+    def validate_complete(self, data, **kwargs):
+        require(data, 'company_name', 'phone', 'declared_billing')
+
+
+class CompanyExportArgs(Schema):
+    """
+    Validate query string of the export: ?format=ndjson (default) or csv.
+    """
+    format = fields.String(load_default='ndjson', validate=validate.OneOf(['ndjson', 'csv']))
+
+
+def validate_ids(value: str):
+    ids = value.split(',')
+    if not all(_id.isdigit() for _id in ids):
+        raise ValidationError('Expected comma separated ids.')
+    if len(ids) > 500:
+        raise ValidationError('At most 500 ids.')
+
+
+class CompanyDeleteArgs(Schema):
+    """
+    Validate query string to delete companies: ?ids=1,2,3
+    """
+    ids = fields.String(required=True, validate=validate_ids)
+
+    @post_load
+    def split_ids(self, data, **kwargs):
+        data['ids'] = [int(_id) for _id in data['ids'].split(',')]
+        return data
+
+
+class CompanyUpdateArgs(Schema):
+    """
+    Validate query string to update a company
+    """
+    sync_accounts = fields.Boolean(load_default=False)
+
+
+class CompanyChangesArgs(Schema):
+    """
+    Validate query string of the change feed: ?since=<seq>&limit=&wait=<seconds>
+    """
+    since = fields.Integer(load_default=0, validate=validate.Range(min=0))
+    limit = fields.Integer(validate=validate.Range(min=1))
+    wait = fields.Float(load_default=0, validate=validate.Range(min=0))
+
+
 class BankRequest(CompanyBankAccount):
     """
     Validate request to create/update a bank account
@@ -30,22 +125,97 @@ class BankRequest(CompanyBankAccount):
     pass
 
 
+def validate_company_fields(value: str):
+    unknown = set(value.split(',')) - set(COMPANY_FIELDS)
+    if unknown:
+        raise ValidationError(f'Unknown fields: {", ".join(sorted(unknown))}.')
+
+
+class CompanyDocumentArgs(Schema):
+    """
+    Validate query string choosing the parts of company documents:
+    ?fields=company_name,phone gives only those fields, besides the id, and
+    ?embed=bank_accounts adds the bank accounts. Without either, documents are
+    whole.
+
+    Loads as `document_fields` and `embed_accounts`.
+    """
+    only = fields.String(data_key='fields', validate=validate_company_fields)
+    embed = fields.String(validate=validate.OneOf(['bank_accounts', '']))
+
+    @post_load
+    def document_shape(self, data, **kwargs):
+        only, embed = data.pop('only', None), data.pop('embed', None)
+
+        data['document_fields'] = COMPANY_FIELDS if only is None else tuple(
+            field for field in COMPANY_FIELDS if field in only.split(',')
+        )
+        data['embed_accounts'] = only is None if embed is None else embed == 'bank_accounts'
+
+        return data
+
+
+class CompanyListRequest(CompanyDocumentArgs):
+    """
+    Validate query string to list companies
+    """
+    cursor = fields.Integer(validate=validate.Range(min=0))
+    limit = fields.Integer(validate=validate.Range(min=1))
+
+
+class CompanySearchRequest(CompanyListRequest):
+    """
+    Validate query string to search companies by name or phone prefix
+    """
+    q = fields.String(required=True, validate=validate.Length(min=1, max=80))
+
+
+def load_many(schema: Schema, data) -> Tuple[List[Optional[Dict]], Dict[int, Dict]]:
+    """
+    Loads a list of items, one by one with a single item schema, so a few
+    invalid items don't fail the whole list and the valid ones go through
+    the whole schema, post_load included.
+
+    Returns the loaded items, with None in place of the invalid ones, and the
+    validation errors by item index.
+    """
+    if not isinstance(data, list):
+        raise InvalidRequestSchemaError('Expected a list of items.')
+
+    items, errors = [], {}
+    for index, item in enumerate(data):
+        try:
+            items.append(schema.load(item))
+        except ValidationError as e:
+            items.append(None)
+            errors[index] = e.messages
+
+    return items, errors
+
+
 def validate_request_body(schema: Type[Schema] = None):
     """
     Decorator for Flask request body validation. Useful for request data in
     application/json format.
 
+    The schema is built once, and the body is parsed and loaded once per
+    request. The loaded values are given to the view as the `body` keyword
+    argument.
+
     Usage:
         @app.route('/my-route')
         @validate_request_body(schema=CreateCompanyRequest)
-        def view():
+        def view(body):
             ...
     """
     def validate_decorator(func):
+        loader = schema() if schema else None
+
         def wrapper(*args, **kwargs):
-            if schema:
+            if loader:
                 try:
-                    schema().load(request.json)
+                    with timed('validation'):
+                        kwargs['body'] = loader.load(request.json)
                 except ValidationError as e:
                     # HTTP safe error.
                     raise InvalidRequestSchemaError(str(e))
@@ -57,3 +227,33 @@ def validate_request_body(schema: Type[Schema] = None):
         return wrapper
 
     return validate_decorator
+
+
+def validate_request_args(schema: Type[Schema]):
+    """
+    Decorator for Flask query string validation. The loaded values are given
+    to the view as the `params` keyword argument.
+
+    Usage:
+        @app.route('/my-route')
+        @validate_request_args(schema=ListRequest)
+        def view(params):
+            ...
+    """
+    def validate_decorator(func):
+        loader = schema()
+
+        def wrapper(*args, **kwargs):
+            try:
+                with timed('validation'):
+                    kwargs['params'] = loader.load(request.args)
+            except ValidationError as e:
+                # HTTP safe error.
+                raise InvalidRequestSchemaError(str(e))
+
+            return func(*args, **kwargs)
+
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    return validate_decorator
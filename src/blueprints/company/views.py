@@ -1,56 +1,291 @@
-from flask import request
+import csv
+from functools import partial
+from hashlib import sha1
+from math import ceil
+from time import sleep
+from typing import Dict, Hashable, Iterable, Iterator, Tuple
+
+from flask import abort, current_app, request, stream_with_context
 
 from src.blueprints.company.blueprint import blueprint
-from src.database.models import ClientCompany, CompanyBankAccount
-from src.blueprints.company.validator import CompanyRequest, validate_request_body, BankRequest
+from src.database.cache import company_cache
+from src.database.db import db
+from src.database.group_commit import group_committer
+from src.database.models import BankBillingSummary, ClientCompany, CompanyBankAccount, CompanyChange
+from src.database.projections import (
+    COMPANY_FIELDS, EXPORT_CSV_COLUMNS, company_csv_lines, company_page, export_company_documents,
+    versioned_company_document
+)
+from src.blueprints.company.validator import (
+    CompanyRequest, validate_request_body, BankRequest, CompanyChangesArgs, CompanyDeleteArgs, CompanyDocumentArgs,
+    CompanyExportArgs, CompanyListRequest, CompanySearchRequest, CompanyUpdateArgs, validate_request_args, load_many
+)
+
+
+bulk_loader = CompanyRequest()
 
 
 # Company Routes
+def document_cache_key(company_id: int, fields: Tuple[str, ...], embed_accounts: bool) -> Hashable:
+    if fields == COMPANY_FIELDS and embed_accounts:
+        return company_id
+
+    return company_id, fields, embed_accounts
+
+
+def document_etag(company_id: int, version: int, fields: Tuple[str, ...], embed_accounts: bool) -> str:
+    etag = f'{company_id}-{version}'
+    if fields == COMPANY_FIELDS and embed_accounts:
+        return etag
+
+    part = f'{",".join(fields)};{embed_accounts}'.encode()
+    return f'{etag}-{sha1(part).hexdigest()[:8]}'
+
+
 @blueprint.get('/<int:company_id>')
-def company_get(company_id):
-    return ClientCompany.query.get_or_404(
-        company_id, description='Invalid Company'
-    ).serialize()
+@validate_request_args(schema=CompanyDocumentArgs)
+def company_get(company_id, params):
+    """
+    Served from the company_cache when possible, skipping the JSON encoding. The
+    cache is per worker, so a cached document is served only while its version
+    is still the one in the database, a single primary key lookup.
+
+    The ETag is derived from the company id and version, and the requested
+    part of the document, so clients can send If-None-Match and get a 304 when
+    it didn't change.
+    """
+    fields, embed_accounts = params['document_fields'], params['embed_accounts']
+    cache_key = document_cache_key(company_id, fields, embed_accounts)
+
+    cached = company_cache.get(cache_key)
+    if cached is not None and cached[2] != ClientCompany.current_version(company_id):
+        cached = None
+
+    if cached is not None:
+        etag, body, _ = cached
+        response = current_app.response_class(body, mimetype='application/json')
+    else:
+        document, version = versioned_company_document(company_id, fields, embed_accounts)
+        if document is None:
+            abort(404, description='Invalid Company')
+
+        response = current_app.json.response(document)
+        etag = document_etag(company_id, version, fields, embed_accounts)
+        company_cache.set(cache_key, etag, response.get_data(), version)
+
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def page_limit(params) -> int:
+    return min(
+        params.get('limit', current_app.config.get('COMPANY_PAGE_SIZE', 50)),
+        current_app.config.get('COMPANY_PAGE_SIZE_MAX', 500),
+    )
+
+
+@blueprint.get('/')
+@validate_request_args(schema=CompanyListRequest)
+def company_list(params):
+    documents, next_cursor = company_page(
+        params.get('cursor'),
+        page_limit(params),
+        fields=params['document_fields'],
+        embed_accounts=params['embed_accounts'],
+    )
+
+    return {
+        'results': documents,
+        'next_cursor': next_cursor,
+    }
+
+
+@blueprint.get('/search')
+@validate_request_args(schema=CompanySearchRequest)
+def company_search(params):
+    """
+    Companies whose name (case insensitive) or phone starts with `q`.
+    """
+    documents, next_cursor = company_page(
+        params.get('cursor'),
+        page_limit(params),
+        ClientCompany.search_criteria(params['q']),
+        fields=params['document_fields'],
+        embed_accounts=params['embed_accounts'],
+    )
+
+    return {
+        'results': documents,
+        'next_cursor': next_cursor,
+    }
+
+
+class _Line:
+    """
+    File-like target of csv.writer that hands back each written line.
+    """
+    def write(self, line: str) -> str:
+        return line
+
+
+def ndjson_export(documents: Iterable[Dict]) -> Iterator[str]:
+    for document in documents:
+        yield current_app.json.dumps(document) + '\n'
+
+
+def csv_export(documents: Iterable[Dict]) -> Iterator[str]:
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_CSV_COLUMNS)
+    for document in documents:
+        yield ''.join(writer.writerow(line) for line in company_csv_lines(document))
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_export, 'application/x-ndjson'),
+    'csv': (csv_export, 'text/csv'),
+}
+
+
+@blueprint.get('/export')
+@validate_request_args(schema=CompanyExportArgs)
+def company_export(params):
+    """
+    Every company with its bank accounts, in the layout of
+    ClientCompany.serialize(), as one JSON document per line or as CSV. The
+    body is streamed while the rows are read, so the first bytes go out right
+    away and memory stays flat whatever the number of companies.
+    """
+    export, mimetype = EXPORT_FORMATS[params['format']]
+    documents = export_company_documents(current_app.config.get('COMPANY_EXPORT_BATCH_SIZE', 1000))
+
+    response = current_app.response_class(
+        stream_with_context(export(documents)), mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=companies.{params["format"]}'
+    return response
+
+
+@blueprint.get('/stats')
+def company_stats():
+    """
+    Per bank, how many companies have accounts in it and the sum of their
+    declared billing, read from the BankBillingSummary.
+    """
+    return {'banks': BankBillingSummary.totals()}
+
+
+@blueprint.get('/changes')
+@validate_request_args(schema=CompanyChangesArgs)
+def company_changes(params):
+    """
+    The changes of companies after the sequence number `since`, in order, so a
+    mirror fetches only what changed: the created and updated companies again,
+    and drops the deleted ones. Passing back `next_since` resumes the feed.
+
+    With ?wait=<seconds> and no changes yet, the request waits for them,
+    polling every CHANGE_FEED_POLL_SECONDS, up to CHANGE_FEED_MAX_WAIT_SECONDS.
+    The connection goes back to the pool while it waits.
+    """
+    since = params['since']
+    limit = min(
+        params.get('limit', current_app.config.get('CHANGE_FEED_PAGE_SIZE', 100)),
+        current_app.config.get('CHANGE_FEED_PAGE_SIZE_MAX', 1000),
+    )
+    wait = min(params['wait'], current_app.config.get('CHANGE_FEED_MAX_WAIT_SECONDS', 30))
+    poll_seconds = current_app.config.get('CHANGE_FEED_POLL_SECONDS', 0.5)
+
+    changes = CompanyChange.since(since, limit)
+    for _ in range(ceil(wait / poll_seconds)):
+        if changes:
+            break
+
+        db.session.close()
+        sleep(poll_seconds)
+        changes = CompanyChange.since(since, limit)
+
+    return {
+        'changes': changes,
+        'next_since': changes[-1]['seq'] if changes else since,
+    }
 
 
 @blueprint.post('/')
 @validate_request_body(schema=CompanyRequest)
-def company_post():
-    ClientCompany.create_from_dict(request.json)
+def company_post(body):
+    """
+    Committed with the creates of other requests of this worker, when group
+    commit is enabled, see GroupCommitter.
+    """
+    group_committer.submit(partial(ClientCompany.add_from_dict, body))
     return ''
 
 
+@blueprint.post('/bulk')
+def company_bulk_post():
+    """
+    Creates many companies at once. Invalid items are reported by their index
+    and don't stop the valid ones from being created.
+    """
+    items, errors = load_many(bulk_loader, request.json)
+    positions = [index for index, item in enumerate(items) if item is not None]
+
+    ids, create_errors = ClientCompany.create_many(
+        [items[index] for index in positions],
+        chunk_size=current_app.config.get('COMPANY_BULK_CHUNK_SIZE', 1000),
+    )
+    created_ids = dict(zip(positions, ids))
+    errors.update({positions[index]: error for index, error in create_errors.items()})
+
+    return {
+        'ids': [created_ids.get(index) for index in range(len(items))],
+        'errors': errors,
+    }
+
+
 @blueprint.delete('/<int:company_id>')
 def company_delete(company_id):
     ClientCompany.delete_by_id(company_id)
     return ''
 
 
+@blueprint.delete('/')
+@validate_request_args(schema=CompanyDeleteArgs)
+def company_bulk_delete(params):
+    """
+    Deletes the companies of ?ids=1,2,3 in one statement. Ids that don't exist
+    are ignored.
+    """
+    return {'deleted': ClientCompany.delete_many(params['ids'])}
+
+
 @blueprint.put('/<int:company_id>')
+@validate_request_args(schema=CompanyUpdateArgs)
 @validate_request_body(schema=CompanyRequest)
-def company_update(company_id):
+def company_update(company_id, params, body):
+    """
+    With ?sync_accounts=true, the company's bank accounts become the ones in
+    the body, otherwise the body's accounts are added to them.
+    """
     client_company = ClientCompany.query.get_or_404(company_id)
-    client_company.update_from_dict(request.json)
+    client_company.update_from_dict(body, sync_accounts=params['sync_accounts'])
     return ''
 
 
 # Bank Model Routes
-@validate_request_body(schema=BankRequest)
 @blueprint.post('/<int:company_id>/bank_account')
-def add_bank_account(company_id):
+@validate_request_body(schema=BankRequest)
+def add_bank_account(company_id, body):
     client_company = ClientCompany.query.get_or_404(company_id)
-    bank_account = CompanyBankAccount.create_from_dict(request.json)
-
-    client_company.add_bank_account(bank_account)
+    client_company.add_bank_account(CompanyBankAccount(**body))
 
     return ''
 
 
-@validate_request_body(schema=BankRequest)
 @blueprint.put('/account/<int:account_id>')
-def update_bank_account(account_id):
-    bank_account = CompanyBankAccount.query.get(account_id)
-    bank_account.update_from_dict(request.json)
+@validate_request_body(schema=BankRequest)
+def update_bank_account(account_id, body):
+    bank_account = CompanyBankAccount.query.get_or_404(account_id)
+    bank_account.update_from_dict(body)
     return ''
 
 
@@ -0,0 +1,2 @@
+from .blueprint import *
+from .views import *
@@ -0,0 +1,26 @@
+from os import getpid
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.blueprints.health.blueprint import blueprint
+from src.database.db import db
+from src.database.pool import pool_status
+
+
+@blueprint.get('/health')
+def health():
+    """
+    Database reachability and the connection pool of the worker that answered.
+    """
+    try:
+        db.session.execute(text('SELECT 1'))
+        database, status_code = 'ok', 200
+    except SQLAlchemyError:
+        database, status_code = 'unavailable', 503
+
+    return {
+        'pid': getpid(),
+        'database': database,
+        'pool': pool_status(db.engine.pool),
+    }, status_code
@@ -0,0 +1,59 @@
+from typing import Optional
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+"""
+Async driver of each backend, when SQLALCHEMY_ASYNC_DATABASE_URI isn't set.
+"""
+
+
+def async_database_uri(config) -> URL:
+    """
+    SQLALCHEMY_ASYNC_DATABASE_URI, or SQLALCHEMY_DATABASE_URI with the async
+    driver of its backend.
+    """
+    if config.get('SQLALCHEMY_ASYNC_DATABASE_URI'):
+        return make_url(config['SQLALCHEMY_ASYNC_DATABASE_URI'])
+
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+class AsyncDatabase:
+    """
+    Async engine and session factory of the async app, see src.asgi. The models
+    are the same mapped classes as the sync app's, only the engine and session
+    differ.
+
+    Usage:
+        async with async_db.session() as session:
+            await session.execute(...)
+    """
+
+    def __init__(self):
+        self.engine: Optional[AsyncEngine] = None
+        self.session: Optional[sessionmaker] = None
+
+    def init_app(self, app):
+        url = async_database_uri(app.config)
+
+        # SQLite uses its own pool, without size or overflow.
+        options = {}
+        if url.get_backend_name() != 'sqlite':
+            options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+        self.engine = create_async_engine(url, **options)
+        self.session = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def dispose(self):
+        await self.engine.dispose()
+
+
+async_db = AsyncDatabase()
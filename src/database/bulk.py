@@ -0,0 +1,149 @@
+import csv
+from io import StringIO
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import Table, bindparam, func, insert, select, text, update
+from sqlalchemy.exc import DBAPIError
+
+from src.database.db import db
+from src.database.models import (
+    Bank, BankBillingSummary, ClientCompany, CompanyBankAccount, CompanyChange, default_now
+)
+
+
+COMPANY_COLUMNS = ('id', 'company_name', 'phone', 'created', 'declared_billing', 'version')
+ACCOUNT_COLUMNS = ('company_id', 'bank_code', 'agency', 'account_number')
+
+
+def is_postgres() -> bool:
+    return db.engine.dialect.name == 'postgresql'
+
+
+def allocate_company_ids(count: int) -> List[int]:
+    """
+    Ids for companies about to be inserted, so their bank accounts can be
+    inserted in the same batch without reading the ids back.
+
+    On Postgres they come from the id sequence, so concurrent inserts never get
+    them. Elsewhere they follow the greatest id, which is only safe while
+    nothing else inserts companies, a conflict makes the insert fail.
+    """
+    if not count:
+        return []
+
+    if is_postgres():
+        return db.session.execute(
+            text(
+                "SELECT nextval(pg_get_serial_sequence('client_company', 'id'))"
+                ' FROM generate_series(1, :count)'
+            ),
+            {'count': count},
+        ).scalars().all()
+
+    last_id = db.session.execute(select(func.max(ClientCompany.id))).scalar() or 0
+    return list(range(last_id + 1, last_id + count + 1))
+
+
+def copy_rows(table: Table, columns: Sequence[str], rows: List[Tuple]):
+    """
+    Postgres COPY of the rows, through the connection of the session, so it's
+    part of its transaction. None is written unquoted, which COPY reads as NULL.
+    Driver errors are raised as SQLAlchemy's, like those of any statement.
+    """
+    buffer = StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+
+    statement = f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+    dbapi = db.engine.dialect.dbapi
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except dbapi.Error as e:
+        raise DBAPIError.instance(statement, None, e, dbapi.Error)
+    finally:
+        cursor.close()
+
+
+def insert_rows(table: Table, columns: Sequence[str], rows: List[Tuple]):
+    """
+    COPY on Postgres, a single executemany INSERT elsewhere.
+    """
+    if not rows:
+        return
+
+    if is_postgres():
+        copy_rows(table, columns, rows)
+    else:
+        db.session.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def sync_banks(banks: Dict[str, str]):
+    """
+    Creates the given banks, by code and name, and renames the existing ones
+    whose name changed, bumping the versions of the companies with accounts in
+    them, like Bank.save(). Commit is up to the caller.
+    """
+    if not banks:
+        return
+
+    stored = dict(db.session.execute(
+        select(Bank.code, Bank.name).where(Bank.code.in_(banks))
+    ).all())
+    insert_rows(
+        Bank.__table__,
+        ('code', 'name'),
+        [(code, name) for code, name in banks.items() if code not in stored],
+    )
+
+    renamed = [
+        {'bank_code': code, 'bank_name': name}
+        for code, name in banks.items()
+        if code in stored and stored[code] != name
+    ]
+    if renamed:
+        db.session.execute(
+            update(Bank.__table__).where(Bank.code == bindparam('bank_code')).values(
+                name=bindparam('bank_name')
+            ),
+            renamed,
+        )
+        ClientCompany.bump_versions(ClientCompany.id.in_(
+            select(CompanyBankAccount.company_id).where(
+                CompanyBankAccount.bank_code.in_([bank['bank_code'] for bank in renamed])
+            )
+        ))
+
+
+def load_companies(companies: Iterable[Dict]) -> List[int]:
+    """
+    Inserts validated companies (CompanyRequest) and their bank accounts, two
+    batches in all whatever their amount, without building any model. Repeated
+    accounts of a company are inserted once. The BankBillingSummary is updated
+    with them and their creation is recorded in the CompanyChange feed. Commit
+    is up to the caller.
+
+    Returns the ids of the companies, in order.
+    """
+    companies = list(companies)
+    ids = allocate_company_ids(len(companies))
+    created = default_now()
+
+    company_rows, account_rows = [], []
+    for company_id, company in zip(ids, companies):
+        company_rows.append((
+            company_id, company['company_name'], company['phone'], created, company['declared_billing'], 1
+        ))
+
+        accounts = {
+            (account['bank_code'], account['agency'], account['account_number'])
+            for account in company.get('bank_accounts') or []
+        }
+        account_rows.extend((company_id, *account) for account in sorted(accounts))
+
+    insert_rows(ClientCompany.__table__, COMPANY_COLUMNS, company_rows)
+    insert_rows(CompanyBankAccount.__table__, ACCOUNT_COLUMNS, account_rows)
+    BankBillingSummary.apply((None, BankBillingSummary.state_of(company)) for company in companies)
+    CompanyChange.record('create', ids)
+
+    return ids
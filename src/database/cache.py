@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from src.database.db import db
+
+
+class BankCache:
+    """
+    Per worker cache of bank code -> serialized Bank.
+
+    Banks are reference data that barely change, so the whole table is kept in
+    memory. It is reloaded after a Bank is saved/deleted in this worker, or after
+    BANK_CACHE_TTL seconds so changes made by other workers are seen too.
+
+    Codes missing from a fresh load are remembered as missing until then too, so
+    repeated lookups of unknown codes don't reload the table each time.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._banks: Optional[Dict[str, Dict]] = None
+        self._missing: Set[str] = set()
+        self._loaded_at = 0.0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        # No query here: the cache loads on first use, in each worker.
+        self.ttl = app.config.get('BANK_CACHE_TTL', self.ttl)
+
+    def load(self) -> Dict[str, Dict]:
+        from src.database.models import Bank
+
+        with self._lock:
+            with db.engine.connect() as connection:
+                rows = connection.execute(select(Bank.code, Bank.name)).all()
+
+            return self._fill(rows)
+
+    def _fill(self, rows) -> Dict[str, Dict]:
+        self._banks = {code: {'code': code, 'name': name} for code, name in rows}
+        self._missing = set()
+        self._loaded_at = monotonic()
+
+        return self._banks
+
+    def get(self, code: str) -> Optional[Dict]:
+        banks = self._banks
+        if (
+            banks is None
+            or monotonic() - self._loaded_at > self.ttl
+            or (code not in banks and code not in self._missing)
+        ):
+            banks = self.load()
+
+        bank = banks.get(code)
+        if bank is None:
+            self._missing.add(code)
+            return None
+
+        return dict(bank)
+
+    def invalidate(self):
+        self._banks = None
+        self._missing = set()
+
+
+bank_cache = BankCache()
+
+
+class AsyncBankCache(BankCache):
+    """
+    BankCache for the async app, see src.asgi. It's refreshed with an async
+    session before use, get() never queries.
+    """
+
+    async def refresh(self, session):
+        from src.database.models import Bank
+
+        if self._banks is None or monotonic() - self._loaded_at > self.ttl:
+            self._fill((await session.execute(select(Bank.code, Bank.name))).all())
+
+    def get(self, code: str) -> Optional[Dict]:
+        bank = (self._banks or {}).get(code)
+        return dict(bank) if bank else None
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized documents, as (etag, body, version) tuples, with a
+    time to live.
+
+    The cache is per worker, so invalidating an entry doesn't reach the other
+    workers. Readers must compare the version of an entry against the version
+    stored in the database before serving it. set() never replaces an entry
+    with an older version, so a slow reader can't overwrite a newer document.
+
+    Size and TTL are set by the <PREFIX>_CACHE_SIZE and <PREFIX>_CACHE_TTL
+    configs, a size of 0 disables the cache.
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 1024, ttl: float = 60):
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config.get(f'{self.prefix}_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get(f'{self.prefix}_CACHE_TTL', self.ttl)
+        self.clear()
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes, int]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, etag, body, version = entry
+            if monotonic() > expires_at:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return etag, body, version
+
+    def set(self, key: Hashable, etag: str, body: bytes, version: int):
+        if not self.maxsize:
+            return
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] > version:
+                return
+
+            self._entries[key] = (monotonic() + self.ttl, etag, body, version)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+company_cache = ResponseCache('COMPANY')
+"""
+Serialized company documents by company id.
+"""
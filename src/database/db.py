@@ -1,9 +1,137 @@
+from sqlite3 import Connection as SQLiteConnection
+from time import monotonic
 from typing import Optional
-from flask_sqlalchemy import SQLAlchemy
 
-db: Optional[SQLAlchemy] = None
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy as BaseSQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+from src.database.pool import InstrumentedQueuePool
+
+
+class ReplicaRouter:
+    """
+    Which engine the reads of GET requests go to: the SQLALCHEMY_BINDS entry
+    named by SQLALCHEMY_REPLICA_BIND, while it's up. Without it, everything
+    goes to the primary.
+
+    The replica is checked once per session, a pool checkout. When it can't be
+    connected to, reads go to the primary for REPLICA_RETRY_SECONDS before
+    trying it again. A replica failing in the middle of a request fails that
+    request only.
+    """
+
+    def __init__(self, retry_seconds: float = 30):
+        self.bind_key: Optional[str] = None
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+
+    def init_app(self, app):
+        self.bind_key = app.config.get('SQLALCHEMY_REPLICA_BIND')
+        self.retry_seconds = app.config.get('REPLICA_RETRY_SECONDS', self.retry_seconds)
+        self._down_until = 0.0
+
+    def engine(self, app) -> Optional[Engine]:
+        if self.bind_key is None or monotonic() < self._down_until:
+            return None
+
+        engine = db.get_engine(app, bind=self.bind_key)
+        try:
+            engine.connect().close()
+        except DBAPIError as e:
+            app.logger.warning('Replica %s is down, reading from the primary: %s', self.bind_key, e)
+            self._down_until = monotonic() + self.retry_seconds
+            return None
+
+        return engine
+
+
+replica_router = ReplicaRouter()
+
+
+def use_replica():
+    """
+    Marks the reads of the current request to go to the replica. See the
+    company blueprint, whose GET routes are.
+    """
+    g.use_replica = True
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session that sends the reads of the requests marked by use_replica() to the
+    replica, see ReplicaRouter. Once it writes, by a flush or an INSERT,
+    UPDATE or DELETE, everything else it does goes to the primary, so a request
+    always reads its own writes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wrote = False
+        self._replica: Optional[Engine] = None
+        self._replica_checked = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+
+        if not self.wrote and has_app_context() and g.get('use_replica'):
+            if not self._replica_checked:
+                self._replica = replica_router.engine(self.app)
+                self._replica_checked = True
+            if self._replica is not None:
+                return self._replica
+
+        return super().get_bind(mapper, clause)
+
+
+class SQLAlchemy(BaseSQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        """
+        Engines that would use the default QueuePool get the instrumented one.
+        Pool size, overflow, timeout, recycle and pre-ping come from
+        SQLALCHEMY_ENGINE_OPTIONS.
+        """
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        options.setdefault('poolclass', InstrumentedQueuePool)
+
+        return sa_url, options
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """
+    SQLite ignores foreign keys, and so ON DELETE CASCADE, unless enabled per
+    connection.
+    """
+    if isinstance(dbapi_connection, SQLiteConnection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+db = SQLAlchemy()
+"""
+Created without an app, so the models can be declared on import. See init_from_app().
+"""
 
 
 def init_from_app(app):
-    global db
-    db = SQLAlchemy(app)
+    db.init_app(app)
+    replica_router.init_app(app)
+
+
+def dispose_engine(app):
+    """
+    Drops the pooled connections inherited from the parent process, without
+    closing them, since they are still the parent's. The forked worker opens
+    its own on first use. See post_fork in gunicorn.conf.py.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,109 @@
+from threading import Event, Lock
+from typing import Callable, List, Optional, TypeVar
+
+from src.database.db import db
+
+T = TypeVar('T')
+
+
+class _Pending:
+    """
+    A unit of work waiting for its group's commit, and its outcome.
+    """
+
+    def __init__(self, unit: Callable):
+        self.unit = unit
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.done = Event()
+
+
+class GroupCommitter:
+    """
+    Coalesces the writes of concurrent requests of a worker into one
+    transaction, so a burst of them waits on one commit (one fsync) instead of
+    one each. Only requests served at the same time by the threads of a worker
+    are grouped, see `threads` in gunicorn.conf.py.
+
+    A write is submitted as a unit of work: a callable that changes db.session
+    without committing. The first unit of a group waits up to
+    GROUP_COMMIT_WINDOW_SECONDS for others, or until GROUP_COMMIT_MAX_BATCH
+    units are waiting, then runs them all in its thread, each in a savepoint,
+    and commits once. A unit that fails is rolled back alone and its error is
+    raised to its own request; if the commit fails, every unit of the group
+    gets that error.
+
+    Units run in another request's thread and session, so they must only use
+    db.session and the arguments they were built with, and return plain values
+    rather than instances.
+
+    Disabled (GROUP_COMMIT_ENABLED, off by default), units run and commit on
+    their own, as before.
+    """
+
+    def __init__(self, enabled: bool = False, window: float = 0.002, max_batch: int = 64):
+        self.enabled = enabled
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = Lock()
+        self._batch: List[_Pending] = []
+        self._full = Event()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('GROUP_COMMIT_ENABLED', self.enabled)
+        self.window = app.config.get('GROUP_COMMIT_WINDOW_SECONDS', self.window)
+        self.max_batch = app.config.get('GROUP_COMMIT_MAX_BATCH', self.max_batch)
+
+    def submit(self, unit: Callable[[], T]) -> T:
+        """
+        Runs the unit and commits it, alone or with the units submitted at the
+        same time. Returns what the unit returned, once committed.
+        """
+        if not self.enabled:
+            result = unit()
+            db.session.commit()
+            return result
+
+        pending = _Pending(unit)
+        with self._lock:
+            self._batch.append(pending)
+            leader = len(self._batch) == 1
+            if len(self._batch) >= self.max_batch:
+                self._full.set()
+            full = self._full
+
+        if leader:
+            full.wait(self.window)
+            with self._lock:
+                batch, self._batch = self._batch, []
+                self._full = Event()
+            self._commit(batch)
+        else:
+            pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    @staticmethod
+    def _commit(batch: List[_Pending]):
+        try:
+            for pending in batch:
+                try:
+                    with db.session.begin_nested():
+                        pending.result = pending.unit()
+                except Exception as e:
+                    pending.error = e
+
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for pending in batch:
+                    pending.error = pending.error or e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+
+group_committer = GroupCommitter()
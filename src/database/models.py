@@ -1,6 +1,15 @@
-from typing import Dict
+from collections import Counter
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import abort, current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql import Delete, Select, Update
 
 from src.exceptions import InvalidException
+from src.database.cache import bank_cache, company_cache
 from src.database.db import db
 from src.database.mixin import SaveMixin
 
@@ -10,6 +19,37 @@ def default_now():
     return datetime.utcnow()
 
 
+LOADING_STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+}
+"""
+Eager loading strategies that can be set on the read path relationship.
+"""
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    # Postgres unique_violation SQLSTATE, or the SQLite message.
+    return (
+        getattr(error.orig, 'pgcode', None) == '23505'
+        or 'UNIQUE constraint failed' in str(error.orig)
+    )
+
+
+def commit_unique(message: str):
+    """
+    Commits the session, turning unique constraint violations into an
+    InvalidException with the given message.
+    """
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_unique_violation(e):
+            raise InvalidException(message)
+        raise
+
+
 class ClientCompany(db.Model, SaveMixin):
     id = db.Column(db.Integer, primary_key=True)
 
@@ -31,10 +71,88 @@ class ClientCompany(db.Model, SaveMixin):
     How much money a company has made. For this test project, the time frame is unspecified.
     """
 
-    bank_accounts = db.relationship('CompanyBankAccount', backref='company')
+    bank_accounts = db.relationship('CompanyBankAccount', backref='company', passive_deletes=True)
     """
     Relation with CompanyBankAccount. Use .add_bank_account()
+
+    The database deletes the accounts of a deleted company (ON DELETE CASCADE),
+    so the ORM doesn't load them to do it.
+    """
+
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     """
+    Incremented, in the same transaction, by every change to the company document:
+    the company, its bank accounts or their banks. Cached documents are served
+    only while their version is the current one, see bump_versions().
+    """
+
+    __table_args__ = (
+        # Prefix searches, see search_criteria(). text_pattern_ops lets
+        # Postgres use the indexes for LIKE 'prefix%' in any collation.
+        db.Index(
+            'ix_client_company_company_name_lower',
+            db.func.lower(company_name).label('company_name_lower'),
+            postgresql_ops={'company_name_lower': 'text_pattern_ops'},
+        ),
+        db.Index(
+            'ix_client_company_phone',
+            phone,
+            postgresql_ops={'phone': 'text_pattern_ops'},
+        ),
+    )
+
+    @classmethod
+    def read_options(cls) -> List:
+        """
+        Loader options that fetch the company and its bank accounts in a fixed
+        number of queries, no matter how many accounts there are. Banks come
+        from the bank_cache, so they don't need to be loaded.
+
+        The strategy is set by the BANK_ACCOUNTS_LOADING config.
+
+        The GET routes use the Core projection in src.database.projections
+        instead, this is the read path for code that needs the models.
+        """
+        accounts_loading = LOADING_STRATEGIES[
+            current_app.config.get('BANK_ACCOUNTS_LOADING', 'selectin')
+        ]
+
+        return [accounts_loading(cls.bank_accounts)]
+
+    @classmethod
+    def get_for_read(cls, company_id: int) -> 'ClientCompany':
+        return cls.query.options(*cls.read_options()).get_or_404(
+            company_id, description='Invalid Company'
+        )
+
+    @classmethod
+    def list_page(
+        cls, cursor: Optional[int], limit: int
+    ) -> Tuple[List['ClientCompany'], Optional[int]]:
+        """
+        Keyset pagination over the company id. Returns the page and the cursor for
+        the next one, None when this is the last page.
+        """
+        query = cls.query.options(*cls.read_options()).order_by(cls.id)
+        if cursor is not None:
+            query = query.filter(cls.id > cursor)
+
+        # One extra row tells if there is a next page without a COUNT.
+        companies = query.limit(limit + 1).all()
+        if len(companies) > limit:
+            return companies[:limit], companies[limit - 1].id
+
+        return companies, None
+
+    @classmethod
+    def search_criteria(cls, term: str):
+        """
+        Companies whose lower cased name or phone starts with the term.
+        """
+        return db.or_(
+            db.func.lower(cls.company_name).startswith(term.lower(), autoescape=True),
+            cls.phone.startswith(term, autoescape=True),
+        )
 
     def serialize(self, include_id: bool = True) -> Dict:
         _dict = {
@@ -51,43 +169,262 @@ class ClientCompany(db.Model, SaveMixin):
 
         return _dict
 
-    def update_from_dict(self, _dict: Dict):
+    @classmethod
+    def version_bump(cls, *criteria) -> Update:
+        """
+        UPDATE incrementing the version of the companies matching the criteria,
+        without loading them.
+        """
+        return db.update(cls).where(*criteria).values(version=cls.version + 1).execution_options(
+            synchronize_session=False
+        )
+
+    @classmethod
+    def bump_versions(cls, *criteria):
+        """
+        Increments the version of the companies matching the criteria, without
+        loading them, and records their update in the CompanyChange feed.
+        Pending changes are flushed by the caller's commit, so their errors are
+        raised there. Commit is up to the caller.
+        """
+        with db.session.no_autoflush:
+            db.session.execute(cls.version_bump(*criteria))
+        CompanyChange.record_where('update', *criteria)
+
+    @classmethod
+    def current_version(cls, company_id: int) -> Optional[int]:
+        """
+        The version of the company, None when it doesn't exist. A single
+        primary key lookup of one column.
+        """
+        return db.session.execute(
+            db.select(cls.version).where(cls.id == company_id)
+        ).scalar()
+
+    def apply_dict(self, _dict: Dict):
+        """
+        Sets the given fields and appends the new bank accounts, without
+        committing. Accounts already registered to the company are skipped, so
+        resubmitting the company with its accounts doesn't violate
+        uq_company_bank_account.
+        """
         if _dict.get('bank_accounts'):
+            registered = {account.natural_key() for account in self.bank_accounts}
             for bank in _dict.pop('bank_accounts'):
-                self.bank_accounts.append(CompanyBankAccount(**bank))
+                account = CompanyBankAccount(**bank)
+                if account.natural_key() not in registered:
+                    registered.add(account.natural_key())
+                    self.bank_accounts.append(account)
 
         for key, value in _dict.items():
             setattr(self, key, value)
+        self.version = ClientCompany.version + 1
 
-        db.session.commit()
+    @staticmethod
+    def stored_accounts_select(company_id: int) -> Select:
+        return db.select(
+            CompanyBankAccount.id,
+            CompanyBankAccount.bank_code,
+            CompanyBankAccount.agency,
+            CompanyBankAccount.account_number,
+        ).where(CompanyBankAccount.company_id == company_id)
 
-    def add_bank_account(self, bank_account: 'CompanyBankAccount'):
-        for _bank_account in self.bank_accounts:
-            if bank_account.is_same(_bank_account):
-                raise InvalidException('Account already registered.')
+    @staticmethod
+    def sync_accounts_statements(
+        company_id: int, stored_rows: Iterable[Tuple], accounts: List[Dict]
+    ) -> List[Tuple]:
+        """
+        The statements, as (statement, parameters) tuples, that make the rows of
+        stored_accounts_select() the given accounts: a single DELETE of the
+        stored accounts that weren't given and a single executemany INSERT of
+        the given accounts that aren't stored. Accounts are compared by
+        natural key, so the work is proportional to the change, not to the
+        amount of accounts.
+        """
+        stored = {
+            (bank_code, agency, account_number): account_id
+            for account_id, bank_code, agency, account_number in stored_rows
+        }
+        given = {CompanyBankAccount(**account).natural_key(): account for account in accounts}
+
+        statements = []
+        deleted_ids = [account_id for key, account_id in stored.items() if key not in given]
+        if deleted_ids:
+            statements.append((
+                db.delete(CompanyBankAccount).where(
+                    CompanyBankAccount.id.in_(deleted_ids)
+                ).execution_options(synchronize_session=False),
+                None,
+            ))
+
+        inserted = [
+            dict(account, company_id=company_id) for key, account in given.items() if key not in stored
+        ]
+        if inserted:
+            statements.append((db.insert(CompanyBankAccount), inserted))
+
+        return statements
+
+    def update_from_dict(self, _dict: Dict, sync_accounts: bool = False):
+        """
+        With sync_accounts, the given bank_accounts replace the stored ones,
+        see sync_accounts_statements(). Otherwise they are added to them.
+        """
+        company_id = self.id
+        changes_accounts = _dict.get('bank_accounts') or (sync_accounts and 'bank_accounts' in _dict)
+        if 'declared_billing' in _dict or changes_accounts:
+            BankBillingSummary.apply_update(
+                company_id, lambda before: BankBillingSummary.updated_state(before, _dict, sync_accounts)
+            )
+
+        if sync_accounts and 'bank_accounts' in _dict:
+            stored_rows = db.session.execute(self.stored_accounts_select(company_id))
+            statements = self.sync_accounts_statements(
+                company_id, stored_rows, _dict.pop('bank_accounts') or []
+            )
+            with db.session.no_autoflush:
+                for statement, parameters in statements:
+                    db.session.execute(statement, parameters)
+
+        self.apply_dict(_dict)
+        CompanyChange.record('update', [company_id])
+
+        commit_unique('Account already registered.')
+        company_cache.invalidate(company_id)
 
-        self.bank_accounts.append(bank_account)
-        self.save()
+    def add_bank_account(self, bank_account: 'CompanyBankAccount'):
+        """
+        A single insert and commit, without loading the other accounts. The
+        database refuses duplicates with the uq_company_bank_account constraint.
+        """
+        company_id = self.id
+        BankBillingSummary.apply_update(
+            company_id, lambda before: BankBillingSummary.moved_state(before, None, bank_account.bank_code)
+        )
+        bank_account.company_id = company_id
+
+        db.session.add(bank_account)
+        self.version = ClientCompany.version + 1
+        CompanyChange.record('update', [company_id])
+        commit_unique('Account already registered.')
+        company_cache.invalidate(company_id)
 
     @classmethod
-    def create_from_dict(cls, _dict: Dict) -> 'ClientCompany':
-        bank_accounts = []
+    def build_from_dict(cls, _dict: Dict) -> 'ClientCompany':
+        bank_accounts = [
+            CompanyBankAccount(**bank) for bank in _dict.pop('bank_accounts', None) or []
+        ]
 
-        if _dict.get('bank_accounts'):
-            for bank in _dict.pop('bank_accounts'):
-                bank_accounts.append(CompanyBankAccount(**bank))
+        return cls(**_dict, bank_accounts=bank_accounts)
 
-        client_company = cls(**_dict, bank_accounts=bank_accounts)
+    @classmethod
+    def add_from_dict(cls, _dict: Dict) -> 'ClientCompany':
+        """
+        Adds the company to the session, commit is up to the caller. A unit of
+        work of the group_committer. It's flushed for its id, which its
+        CompanyChange refers to.
+        """
+        BankBillingSummary.apply([(None, BankBillingSummary.state_of(_dict))])
+        client_company = cls.build_from_dict(_dict)
         db.session.add(client_company)
+        db.session.flush()
+        CompanyChange.record('create', [client_company.id])
+
+        return client_company
+
+    @classmethod
+    def create_from_dict(cls, _dict: Dict) -> 'ClientCompany':
+        client_company = cls.add_from_dict(_dict)
         db.session.commit()
 
         return client_company
 
+    @classmethod
+    def create_many(
+        cls, dicts: List[Dict], chunk_size: int
+    ) -> Tuple[List[Optional[int]], Dict[int, Dict]]:
+        """
+        Creates the companies and their bank accounts with one transaction per
+        chunk. The flush of a chunk batches its INSERTs, executemany for the
+        bank accounts and, on psycopg2, multi-row INSERT ... RETURNING for the
+        companies.
+
+        Companies with unknown bank codes are not created. When the database
+        refuses a chunk, it is rolled back and its companies are reported, the
+        other chunks are still created.
+
+        Returns the ids in the same order as the dicts, None for the companies
+        not created, and the errors by dict index.
+        """
+        ids: List[Optional[int]] = [None] * len(dicts)
+        errors = {}
+
+        creatable = []
+        for index, _dict in enumerate(dicts):
+            if any(bank_cache.get(bank['bank_code']) is None for bank in _dict.get('bank_accounts') or []):
+                errors[index] = {'bank_accounts': ['Invalid bank code.']}
+            else:
+                creatable.append(index)
+
+        for start in range(0, len(creatable), chunk_size):
+            chunk = creatable[start:start + chunk_size]
+            companies = [cls.build_from_dict(dict(dicts[index])) for index in chunk]
+
+            try:
+                BankBillingSummary.apply([
+                    (None, BankBillingSummary.state_of(dicts[index])) for index in chunk
+                ])
+                db.session.add_all(companies)
+                db.session.flush()
+
+                # Read the ids before commit expires the instances.
+                chunk_ids = [company.id for company in companies]
+                CompanyChange.record('create', chunk_ids)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                errors.update({
+                    index: {'_schema': ['Not created, the database refused a company of its chunk.']}
+                    for index in chunk
+                })
+                continue
+
+            for index, company_id in zip(chunk, chunk_ids):
+                ids[index] = company_id
+
+        return ids, errors
+
+    @classmethod
+    def delete_many_statement(cls, company_ids: List[int]) -> Delete:
+        """
+        A single DELETE of the companies, their bank accounts are deleted by
+        the database.
+        """
+        return db.delete(cls).where(cls.id.in_(company_ids)).execution_options(
+            synchronize_session=False
+        )
+
+    @classmethod
+    def delete_many(cls, company_ids: List[int]) -> int:
+        """
+        Deletes the companies in one statement, without loading them. Returns
+        how many were deleted.
+        """
+        states = BankBillingSummary.states(company_ids)
+        BankBillingSummary.apply((state, None) for state in states.values())
+        CompanyChange.record('delete', list(states))
+        deleted = db.session.execute(cls.delete_many_statement(company_ids)).rowcount
+        db.session.commit()
+
+        for company_id in company_ids:
+            company_cache.invalidate(company_id)
+
+        return deleted
+
     @staticmethod
     def delete_by_id(company_id: int):
-        company = ClientCompany.query.get_or_404(company_id)
-        db.session.delete(company)
-        db.session.commit()
+        if not ClientCompany.delete_many([company_id]):
+            abort(404)
 
 
 class CompanyBankAccount(db.Model, SaveMixin):
@@ -97,24 +434,43 @@ class CompanyBankAccount(db.Model, SaveMixin):
 
     account_number = db.Column(db.String(10), nullable=False)
 
-    bank_code = db.Column(db.String(3), db.ForeignKey('bank.code'), nullable=False)
+    bank_code = db.Column(db.String(3), db.ForeignKey('bank.code'), nullable=False, index=True)
     """
     The 3 digit code that defines the Bank as a Financial Agent. 
     """
 
-    company_id = db.Column(db.Integer, db.ForeignKey('client_company.id'))
+    company_id = db.Column(db.Integer, db.ForeignKey('client_company.id', ondelete='CASCADE'))
+    """
+    Indexed by uq_company_bank_account, where it is the leading column.
+    """
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'company_id', 'bank_code', 'agency', 'account_number',
+            name='uq_company_bank_account',
+        ),
+    )
 
     def update_from_dict(self, _dict: Dict):
+        company_id = self.company_id
+        removed_code, added_code = self.bank_code, _dict.get('bank_code', self.bank_code)
+        if added_code != removed_code:
+            BankBillingSummary.apply_update(
+                company_id, lambda before: BankBillingSummary.moved_state(before, removed_code, added_code)
+            )
+
         for key, value in _dict.items():
             setattr(self, key, value)
 
-        db.session.commit()
+        ClientCompany.bump_versions(ClientCompany.id == company_id)
+        commit_unique('Account already registered.')
+        company_cache.invalidate(company_id)
 
     def serialize(self, include_user: bool = False, include_id: bool = True) -> Dict:
         _dict = {
             'agency': self.agency,
             'account_number': self.account_number,
-            'bank': self.bank.serialize,
+            'bank': bank_cache.get(self.bank_code),
         }
 
         if include_user:
@@ -123,24 +479,23 @@ class CompanyBankAccount(db.Model, SaveMixin):
             _dict['id'] = self.id
         return _dict
 
-    def is_same(self, account: 'CompanyBankAccount') -> bool:
-        fields = ['agency', 'account_number', 'bank_code']
-        for field in fields:
-            if not getattr(self, field) == getattr(account, field):
-                return False
-
-        return True
-
-    @classmethod
-    def create_from_dict(cls, _dict: Dict) -> 'CompanyBankAccount':
-        account = CompanyBankAccount(**_dict)
-        account.save()
-
-        return account
+    def natural_key(self) -> Tuple:
+        """
+        The columns of uq_company_bank_account, besides the company.
+        """
+        return self.bank_code, self.agency, self.account_number
 
     @staticmethod
     def delete_by_id(_id: int):
-        CompanyBankAccount.query.get_or_404(_id).delete()
+        account = CompanyBankAccount.query.get_or_404(_id)
+        company_id = account.company_id
+        BankBillingSummary.apply_update(
+            company_id, lambda before: BankBillingSummary.moved_state(before, account.bank_code, None)
+        )
+        db.session.delete(account)
+        ClientCompany.bump_versions(ClientCompany.id == company_id)
+        db.session.commit()
+        company_cache.invalidate(company_id)
 
 
 class Bank(db.Model, SaveMixin):
@@ -162,8 +517,345 @@ class Bank(db.Model, SaveMixin):
             'name': self.name,
         }
 
+    def save(self):
+        """
+        Renaming a bank changes the documents of the companies with accounts in
+        it, so their versions are bumped in the same transaction.
+        """
+        db.session.add(self)
+        ClientCompany.bump_versions(ClientCompany.id.in_(
+            db.select(CompanyBankAccount.company_id).where(CompanyBankAccount.bank_code == self.code)
+        ))
+        db.session.commit()
+        bank_cache.invalidate()
+        company_cache.clear()
+
+    def delete(self):
+        super().delete()
+        bank_cache.invalidate()
+        company_cache.clear()
+
     def __str__(self):
         return self.__repr__()
 
     def __repr__(self):
         return f'{self.code} - {self.name}'
+
+
+UPSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+"""
+INSERT ... ON CONFLICT of each backend.
+"""
+
+BillingState = Tuple[Decimal, Counter]
+"""
+What a company adds to the billing summary: its declared billing and how many
+accounts it has in each bank.
+"""
+
+
+class BankBillingSummary(db.Model):
+    """
+    How many companies have accounts in each bank and the sum of their declared
+    billing, kept up to date by the writes of companies and bank accounts
+    instead of scanning and joining them. A company counts once per bank,
+    however many accounts it has there.
+
+    Writes give the billing state of the companies they change, before and
+    after, to changes_statements(). rebuild() recomputes it from scratch.
+    """
+    bank_code = db.Column(db.String(3), db.ForeignKey('bank.code', ondelete='CASCADE'), primary_key=True)
+
+    company_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    total_billing = db.Column(db.Numeric(20, 2), nullable=False, default=0, server_default='0')
+
+    @staticmethod
+    def states_select(company_ids: List[int]) -> Select:
+        """
+        Billing and bank codes of the companies, locking their rows until the
+        end of the transaction, so concurrent writes of a company are applied
+        one after the other.
+        """
+        return db.select(
+            ClientCompany.id, ClientCompany.declared_billing, CompanyBankAccount.bank_code
+        ).outerjoin(
+            CompanyBankAccount, CompanyBankAccount.company_id == ClientCompany.id
+        ).where(
+            ClientCompany.id.in_(company_ids)
+        ).with_for_update(of=ClientCompany)
+
+    @staticmethod
+    def states_from_rows(rows: Iterable[Tuple]) -> Dict[int, BillingState]:
+        states = {}
+        for company_id, declared_billing, bank_code in rows:
+            _, banks = states.setdefault(company_id, (declared_billing, Counter()))
+            if bank_code is not None:
+                banks[bank_code] += 1
+
+        return states
+
+    @classmethod
+    def states(cls, company_ids: List[int]) -> Dict[int, BillingState]:
+        return cls.states_from_rows(db.session.execute(cls.states_select(company_ids)))
+
+    @staticmethod
+    def state_of(company: Dict) -> BillingState:
+        """
+        The state of a company dict (CompanyRequest) about to be created.
+        """
+        return company.get('declared_billing') or 0, Counter(
+            account['bank_code'] for account in company.get('bank_accounts') or []
+        )
+
+    @staticmethod
+    def updated_state(before: BillingState, _dict: Dict, sync_accounts: bool = False) -> BillingState:
+        """
+        The state of a company after its update with the given dict
+        (CompanyRequest), see ClientCompany.update_from_dict().
+        """
+        billing, banks = before
+        given = Counter(account['bank_code'] for account in _dict.get('bank_accounts') or [])
+        if not (sync_accounts and 'bank_accounts' in _dict):
+            given.update(banks)
+
+        return _dict.get('declared_billing', billing), given
+
+    @staticmethod
+    def moved_state(before: BillingState, removed_code: Optional[str], added_code: Optional[str]) -> BillingState:
+        """
+        The state of a company after one of its accounts moved from
+        removed_code to added_code, None for an account removed or added.
+        """
+        billing, banks = before
+        banks = banks.copy()
+        banks.subtract(filter(None, [removed_code]))
+        banks.update(filter(None, [added_code]))
+
+        return billing, banks
+
+    @classmethod
+    def changes_statements(
+        cls, changes: Iterable[Tuple[Optional[BillingState], Optional[BillingState]]], dialect_name: str
+    ) -> List[Tuple]:
+        """
+        The statements, as (statement, parameters) tuples, applying the
+        (before, after) states of changed companies, None for a company that
+        didn't or doesn't exist anymore: a single executemany upsert adding the
+        differences to the summary rows, inserting the missing ones. Rows are
+        written in bank code order, so concurrent writes lock them in the same
+        order.
+        """
+        deltas: Dict[str, List] = {}
+        for before, after in changes:
+            billing_before, banks_before = before or (0, Counter())
+            billing_after, banks_after = after or (0, Counter())
+            banks_before, banks_after = set(+banks_before), set(+banks_after)
+
+            for bank_code in banks_before | banks_after:
+                delta = deltas.setdefault(bank_code, [0, 0])
+                if bank_code in banks_before:
+                    delta[0] -= 1
+                    delta[1] -= billing_before
+                if bank_code in banks_after:
+                    delta[0] += 1
+                    delta[1] += billing_after
+
+        parameters = [
+            {'bank_code': bank_code, 'company_count': count, 'total_billing': billing}
+            for bank_code, (count, billing) in sorted(deltas.items())
+            if count or billing
+        ]
+        if not parameters:
+            return []
+
+        table = cls.__table__
+        upsert = UPSERTS[dialect_name](table)
+        return [(
+            upsert.on_conflict_do_update(
+                index_elements=[table.c.bank_code],
+                set_={
+                    'company_count': table.c.company_count + upsert.excluded.company_count,
+                    'total_billing': table.c.total_billing + upsert.excluded.total_billing,
+                },
+            ),
+            parameters,
+        )]
+
+    @classmethod
+    def apply(cls, changes: Iterable[Tuple[Optional[BillingState], Optional[BillingState]]]):
+        """
+        Runs changes_statements() in the session, commit is up to the caller.
+        """
+        with db.session.no_autoflush:
+            for statement, parameters in cls.changes_statements(changes, db.engine.dialect.name):
+                db.session.execute(statement, parameters)
+
+    @classmethod
+    def apply_update(cls, company_id: Optional[int], updated: Callable[[BillingState], BillingState]):
+        """
+        Applies the update of a stored company, given the function of its state
+        before to its state after. Called before the update is made.
+        """
+        with db.session.no_autoflush:
+            states = cls.states([company_id])
+
+        if company_id in states:
+            before = states[company_id]
+            cls.apply([(before, updated(before))])
+
+    @classmethod
+    def recompute_select(cls) -> Select:
+        """
+        The summary computed from scratch, scanning every bank account.
+        """
+        company_banks = db.select(
+            CompanyBankAccount.company_id, CompanyBankAccount.bank_code
+        ).distinct().subquery()
+
+        return db.select(
+            company_banks.c.bank_code,
+            db.func.count().label('company_count'),
+            db.func.sum(ClientCompany.declared_billing).label('total_billing'),
+        ).join(
+            ClientCompany, ClientCompany.id == company_banks.c.company_id
+        ).group_by(company_banks.c.bank_code)
+
+    @classmethod
+    def rebuild(cls):
+        db.session.execute(db.delete(cls.__table__))
+        db.session.execute(db.insert(cls).from_select(
+            ['bank_code', 'company_count', 'total_billing'], cls.recompute_select()
+        ))
+        db.session.commit()
+
+    @classmethod
+    def totals(cls) -> List[Dict]:
+        """
+        Banks with companies, with their count and billing.
+        """
+        rows = db.session.execute(
+            db.select(cls.bank_code, Bank.name, cls.company_count, cls.total_billing).join(
+                Bank, Bank.code == cls.bank_code
+            ).where(cls.company_count > 0).order_by(cls.bank_code)
+        )
+        return [
+            {'code': code, 'name': name, 'company_count': company_count, 'total_billing': total_billing}
+            for code, name, company_count, total_billing in rows
+        ]
+
+
+CHANGE_SEQUENCE_LOCK = 0x636f6d70
+"""
+Key of the Postgres advisory lock serializing the commits of CompanyChange rows.
+"""
+
+
+class CompanyChange(db.Model):
+    """
+    Outbox of the changes of company documents, bank accounts included, written
+    in the transaction of the change, so the feed of GET /company/changes has
+    every committed change and nothing else. The id is the sequence number of
+    the feed.
+
+    Ids are handed out on insert, not on commit, so writers hold a lock from
+    their first change to their commit, see lock_statements(): a reader never
+    sees a change before one with a smaller id is committed, and can resume
+    from the last id it read.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+
+    company_id = db.Column(db.Integer, nullable=False)
+    """
+    Not a foreign key, the changes of a company outlive it.
+    """
+
+    operation = db.Column(db.String(6), nullable=False)
+    """
+    create, update or delete.
+    """
+
+    created = db.Column(db.DateTime, nullable=False, default=default_now)
+
+    @staticmethod
+    def lock_statements(dialect_name: str) -> List[Tuple]:
+        """
+        On Postgres, a transaction level advisory lock, released by the commit
+        or rollback. SQLite runs one writer at a time already.
+        """
+        if dialect_name != 'postgresql':
+            return []
+
+        return [(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_SEQUENCE_LOCK})]
+
+    @classmethod
+    def record_statements(cls, operation: str, company_ids: List[int], dialect_name: str) -> List[Tuple]:
+        """
+        The statements, as (statement, parameters) tuples, recording the
+        operation on the companies. Accounts without a company record nothing.
+        """
+        created = default_now()
+        changes = [
+            {'company_id': company_id, 'operation': operation, 'created': created}
+            for company_id in company_ids
+            if company_id is not None
+        ]
+        if not changes:
+            return []
+
+        return cls.lock_statements(dialect_name) + [(db.insert(cls.__table__), changes)]
+
+    @classmethod
+    def record_where_statements(cls, operation: str, criteria: Tuple, dialect_name: str) -> List[Tuple]:
+        """
+        Like record_statements(), for the companies matching the criteria, in a
+        single INSERT ... SELECT.
+        """
+        return cls.lock_statements(dialect_name) + [(
+            db.insert(cls.__table__).from_select(
+                ['company_id', 'operation', 'created'],
+                db.select(ClientCompany.id, db.literal(operation), db.literal(default_now())).where(*criteria),
+            ),
+            None,
+        )]
+
+    @staticmethod
+    def execute(statements: List[Tuple]):
+        with db.session.no_autoflush:
+            for statement, parameters in statements:
+                db.session.execute(statement, parameters)
+
+    @classmethod
+    def record(cls, operation: str, company_ids: List[int]):
+        """
+        Records the operation on the companies in the session, commit is up to
+        the caller.
+        """
+        cls.execute(cls.record_statements(operation, company_ids, db.engine.dialect.name))
+
+    @classmethod
+    def record_where(cls, operation: str, *criteria):
+        cls.execute(cls.record_where_statements(operation, criteria, db.engine.dialect.name))
+
+    @classmethod
+    def since_select(cls, since: int, limit: int) -> Select:
+        return db.select(cls.id, cls.company_id, cls.operation, cls.created).where(
+            cls.id > since
+        ).order_by(cls.id).limit(limit)
+
+    @staticmethod
+    def serialize_rows(rows: Iterable[Tuple]) -> List[Dict]:
+        return [
+            {'seq': seq, 'company_id': company_id, 'operation': operation, 'created': created}
+            for seq, company_id, operation, created in rows
+        ]
+
+    @classmethod
+    def since(cls, since: int, limit: int) -> List[Dict]:
+        """
+        The first changes after the sequence number since, in order.
+        """
+        return cls.serialize_rows(db.session.execute(cls.since_select(since, limit)))
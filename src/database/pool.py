@@ -0,0 +1,114 @@
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import Pool, QueuePool
+
+
+class PoolStats:
+    """
+    Counters of a connection pool in this process.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.overflow_max = 0
+
+    def record_checkout(self, seconds: float, overflow: int):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds_total += seconds
+            self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def record_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def as_dict(self) -> Dict:
+        return {
+            'checkouts': self.checkouts,
+            'checkout_timeouts': self.checkout_timeouts,
+            'checkout_seconds_total': self.checkout_seconds_total,
+            'checkout_seconds_max': self.checkout_seconds_max,
+            'overflow_max': self.overflow_max,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout takes. That is the time a
+    request waits for a free connection, plus connecting or pre-pinging it.
+    """
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            connection = super().connect()
+        except TimeoutError:
+            self.stats.record_timeout()
+            raise
+
+        self.stats.record_checkout(perf_counter() - started, self.overflow())
+        return connection
+
+    def recreate(self):
+        # Keep the counters when the engine is disposed.
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def pool_status(pool: Pool) -> Dict:
+    """
+    Configuration, connections in use and counters of the pool.
+    """
+    status = {'class': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'timeout': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+
+    if isinstance(pool, InstrumentedQueuePool):
+        status['max_overflow'] = pool.max_overflow
+        status.update(pool.stats.as_dict())
+
+    return status
+
+
+def aggregate_worker_status(statuses: List[Dict]) -> Dict:
+    """
+    Sums the /health pool status of several workers, keeping the latest sample
+    of each worker pid.
+    """
+    by_pid = {status['pid']: status['pool'] for status in statuses}
+    pools = list(by_pid.values())
+
+    def total(key):
+        return sum(pool.get(key, 0) for pool in pools)
+
+    return {
+        'workers': len(pools),
+        'checkouts': total('checkouts'),
+        'checkout_timeouts': total('checkout_timeouts'),
+        'checkout_seconds_total': total('checkout_seconds_total'),
+        'checkout_seconds_max': max((pool.get('checkout_seconds_max', 0) for pool in pools), default=0),
+        'overflow_max': max((pool.get('overflow_max', 0) for pool in pools), default=0),
+        'checked_out': total('checked_out'),
+        'connections': total('checked_out') + total('checked_in'),
+    }
@@ -0,0 +1,195 @@
+from itertools import groupby
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
+
+from src.database.cache import BankCache, bank_cache
+from src.database.db import db
+from src.database.models import ClientCompany, CompanyBankAccount
+
+
+COMPANY_FIELDS = ('company_name', 'phone', 'created', 'declared_billing')
+"""
+Fields of a company document, besides its id and bank_accounts.
+"""
+
+
+def company_documents_select(
+    *criteria, fields: Tuple[str, ...] = COMPANY_FIELDS, embed_accounts: bool = True
+) -> Select:
+    """
+    Core select of only the columns of a company document: the given company
+    fields and, when embedded, its bank accounts, in a single query. Without
+    the accounts there's no join at all. Banks come from the bank_cache, so
+    there's no join to them. Rows come ordered by company, so the rows of a
+    company are together.
+    """
+    statement = select(
+        ClientCompany.id.label('id'),
+        ClientCompany.version.label('version'),
+        *[getattr(ClientCompany, field).label(field) for field in fields],
+    ).select_from(
+        ClientCompany
+    ).where(
+        *criteria
+    )
+    if not embed_accounts:
+        return statement.order_by(ClientCompany.id)
+
+    return statement.add_columns(
+        CompanyBankAccount.id.label('account_id'),
+        CompanyBankAccount.agency.label('agency'),
+        CompanyBankAccount.account_number.label('account_number'),
+        CompanyBankAccount.bank_code.label('bank_code'),
+    ).outerjoin(
+        CompanyBankAccount, CompanyBankAccount.company_id == ClientCompany.id
+    ).order_by(
+        ClientCompany.id, CompanyBankAccount.id
+    )
+
+
+def iter_company_documents(
+    rows: Iterable[Row],
+    fields: Tuple[str, ...] = COMPANY_FIELDS,
+    embed_accounts: bool = True,
+    banks: BankCache = bank_cache,
+) -> Iterator[Dict]:
+    """
+    Assembles the rows of company_documents_select into the same dicts as
+    ClientCompany.serialize(), or the given part of them, without loading any
+    model. Documents are yielded as soon as their rows are read, so only the
+    rows of one company are held at a time.
+    """
+    for company_id, company_rows in groupby(rows, key=attrgetter('id')):
+        company_rows = list(company_rows)
+
+        document = {field: getattr(company_rows[0], field) for field in fields}
+        if 'created' in document:
+            document['created'] = document['created'].isoformat()
+        if embed_accounts:
+            document['bank_accounts'] = [
+                {
+                    'agency': row.agency,
+                    'account_number': row.account_number,
+                    'bank': banks.get(row.bank_code),
+                    'id': row.account_id,
+                }
+                for row in company_rows
+                if row.account_id is not None
+            ]
+        document['id'] = company_id
+
+        yield document
+
+
+def company_documents(
+    rows: Iterable[Row],
+    fields: Tuple[str, ...] = COMPANY_FIELDS,
+    embed_accounts: bool = True,
+    banks: BankCache = bank_cache,
+) -> List[Dict]:
+    return list(iter_company_documents(rows, fields, embed_accounts, banks))
+
+
+def export_company_documents(batch_size: int) -> Iterator[Dict]:
+    """
+    Every company document, read through a server side cursor (where the
+    driver has one) fetched batch_size rows at a time, so memory doesn't grow
+    with the table.
+    """
+    rows = db.session.execute(company_documents_select().execution_options(
+        stream_results=True, yield_per=batch_size
+    ))
+    return iter_company_documents(rows)
+
+
+EXPORT_CSV_COLUMNS = (
+    'id', *COMPANY_FIELDS, 'bank_account_id', 'agency', 'account_number', 'bank_code', 'bank_name'
+)
+"""
+Columns of the CSV export, one line per bank account with the company
+repeated, or a single line with empty account columns when it has none.
+"""
+
+
+def company_csv_lines(document: Dict) -> Iterator[Tuple]:
+    company = (document['id'], *[document[field] for field in COMPANY_FIELDS])
+    if not document['bank_accounts']:
+        yield (*company, '', '', '', '', '')
+
+    for account in document['bank_accounts']:
+        bank = account['bank'] or {}
+        yield (
+            *company,
+            account['id'],
+            account['agency'],
+            account['account_number'],
+            bank.get('code', ''),
+            bank.get('name', ''),
+        )
+
+
+def versioned_company_document(
+    company_id: int, fields: Tuple[str, ...] = COMPANY_FIELDS, embed_accounts: bool = True
+) -> Tuple[Optional[Dict], Optional[int]]:
+    """
+    The company document and its version, read by the same query so they
+    always match. (None, None) when the company doesn't exist.
+    """
+    rows = db.session.execute(company_documents_select(
+        ClientCompany.id == company_id, fields=fields, embed_accounts=embed_accounts
+    )).all()
+    if not rows:
+        return None, None
+
+    return company_documents(rows, fields, embed_accounts)[0], rows[0].version
+
+
+def company_document(company_id: int) -> Optional[Dict]:
+    return versioned_company_document(company_id)[0]
+
+
+def company_page_ids_select(cursor: Optional[int], limit: int, *criteria) -> Select:
+    """
+    Ids of a page of the companies matching the criteria, keyset paginated over
+    the company id. One extra company tells if there is a next page without a
+    COUNT, see split_page().
+    """
+    page_ids = select(ClientCompany.id).where(
+        *criteria
+    ).order_by(ClientCompany.id).limit(limit + 1)
+    if cursor is not None:
+        page_ids = page_ids.where(ClientCompany.id > cursor)
+
+    return page_ids
+
+
+def split_page(documents: List[Dict], limit: int) -> Tuple[List[Dict], Optional[int]]:
+    if len(documents) > limit:
+        return documents[:limit], documents[limit - 1]['id']
+
+    return documents, None
+
+
+def company_page(
+    cursor: Optional[int],
+    limit: int,
+    *criteria,
+    fields: Tuple[str, ...] = COMPANY_FIELDS,
+    embed_accounts: bool = True,
+) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Keyset pagination over the company id, of the companies matching the
+    criteria. Returns the page and the cursor for the next one, None when this
+    is the last page.
+    """
+    page_ids = company_page_ids_select(cursor, limit, *criteria)
+    rows = db.session.execute(company_documents_select(
+        ClientCompany.id.in_(page_ids), fields=fields, embed_accounts=embed_accounts
+    ))
+    documents = company_documents(rows, fields, embed_accounts)
+
+    return split_page(documents, limit)
@@ -0,0 +1,277 @@
+"""
+Horizontal sharding of companies across the databases of SQLALCHEMY_SHARDS.
+
+Every company id, and every bank account id, comes from one global sequence
+(HiLoIdGenerator) and is chosen so that `id % number of shards` is the index of
+its shard: a company goes to the shard of its id and its bank accounts get ids
+of the same shard, so any of them is found from its id alone. Banks are
+reference data, replicated to every shard by ShardRouter.save_bank(), so
+accounts join them locally.
+
+Listing and search run on every shard in parallel and merge the pages by id,
+see ShardRouter.company_page().
+
+Shards are given in order and their position is part of the ids, so shards can
+be added only by moving rows to their new shard.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, ColumnElement
+
+from src.database.cache import BankCache
+from src.database.db import db
+from src.database.models import Bank, ClientCompany, CompanyBankAccount
+from src.database.projections import (
+    COMPANY_FIELDS, company_documents, company_documents_select, company_page_ids_select, split_page
+)
+
+id_blocks = Table(
+    'company_id_block',
+    MetaData(),
+    Column('id', Integer, primary_key=True),
+)
+"""
+One row per block of ids reserved by a HiLoIdGenerator, in the first shard.
+"""
+
+
+class HiLoIdGenerator:
+    """
+    Values of a global sequence without a round trip each: a block of
+    block_size values is reserved at once by inserting a row in
+    company_id_block, whose id is the block number. Blocks are reserved on
+    first use, so a generator built before forking the workers holds none.
+    """
+
+    def __init__(self, engine: Engine, block_size: int = 100):
+        self.engine = engine
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = Lock()
+
+    def next_value(self) -> int:
+        with self._lock:
+            if self._next == self._end:
+                with self.engine.begin() as connection:
+                    block = connection.execute(insert(id_blocks)).inserted_primary_key[0]
+                self._next, self._end = block * self.block_size, (block + 1) * self.block_size
+
+            self._next += 1
+            return self._next - 1
+
+
+class ShardBankCache(BankCache):
+    """
+    BankCache of the first shard, every shard has the same banks.
+    """
+
+    def __init__(self, router: 'ShardRouter', ttl: float = 300):
+        super().__init__(ttl)
+        self.router = router
+
+    def load(self) -> Dict[str, Dict]:
+        with self._lock:
+            with self.router.engines[self.router.names[0]].connect() as connection:
+                rows = connection.execute(select(Bank.code, Bank.name)).all()
+
+            return self._fill(rows)
+
+
+SHARDED_COLUMNS = (
+    ClientCompany.__table__.c.id,
+    CompanyBankAccount.__table__.c.id,
+    CompanyBankAccount.__table__.c.company_id,
+)
+"""
+Columns whose values tell the shard of a row.
+"""
+
+
+def is_conjunction(clause) -> bool:
+    return isinstance(clause, BooleanClauseList) and clause.operator == operators.and_
+
+
+def is_sharded_column(clause) -> bool:
+    return isinstance(clause, ColumnElement) and any(
+        clause.shares_lineage(column) for column in SHARDED_COLUMNS
+    )
+
+
+class ShardRouter:
+    """
+    The engines of SQLALCHEMY_SHARDS and the ShardedSession over them. Without
+    shards configured, nothing here is used.
+    """
+
+    def __init__(self):
+        self.engines: Dict[str, Engine] = {}
+        self.names: List[str] = []
+        self.ids: Optional[HiLoIdGenerator] = None
+        self.banks = ShardBankCache(self)
+        self.session = sessionmaker(
+            class_=ShardedSession,
+            shard_chooser=self.shard_chooser,
+            id_chooser=self.id_chooser,
+            execute_chooser=self.execute_chooser,
+        )
+        event.listen(self.session, 'before_flush', self.assign_ids)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def init_app(self, app):
+        # Engines connect on first use, in each worker.
+        self.engines = {
+            name: create_engine(uri) for name, uri in (app.config.get('SQLALCHEMY_SHARDS') or {}).items()
+        }
+        self.names = list(self.engines)
+        self.banks.ttl = app.config.get('BANK_CACHE_TTL', self.banks.ttl)
+        self.banks.invalidate()
+        if not self.engines:
+            return
+
+        self.ids = HiLoIdGenerator(
+            self.engines[self.names[0]], app.config.get('SHARD_ID_BLOCK_SIZE', 100)
+        )
+        self.session.configure(shards=self.engines)
+        self._executor = ThreadPoolExecutor(len(self.engines), thread_name_prefix='shard')
+
+    def create_all(self):
+        for engine in self.engines.values():
+            db.Model.metadata.create_all(engine)
+        id_blocks.metadata.create_all(self.engines[self.names[0]])
+
+    def shard_for(self, _id: int) -> str:
+        return self.names[_id % len(self.names)]
+
+    def new_id(self, shard_index: Optional[int] = None) -> int:
+        """
+        A globally unique id of the given shard, by default the next shard in
+        turn.
+        """
+        value = self.ids.next_value()
+        if shard_index is None:
+            shard_index = value % len(self.names)
+
+        return value * len(self.names) + shard_index
+
+    def assign_ids(self, session, flush_context, instances):
+        """
+        before_flush: new companies get an id, which chooses their shard, and
+        new bank accounts an id of their company's shard.
+        """
+        for instance in session.new:
+            if isinstance(instance, ClientCompany) and instance.id is None:
+                instance.id = self.new_id()
+
+        for instance in session.new:
+            if isinstance(instance, CompanyBankAccount) and instance.id is None:
+                company_id = instance.company_id if instance.company_id is not None else instance.company.id
+                instance.id = self.new_id(company_id % len(self.names))
+
+    def shard_chooser(self, mapper, instance, clause=None) -> str:
+        if isinstance(instance, (ClientCompany, CompanyBankAccount)):
+            return self.shard_for(instance.id)
+
+        # Banks, and statements without an instance. Banks are written by save_bank().
+        return self.names[0]
+
+    def id_chooser(self, query, ident) -> List[str]:
+        if query.column_descriptions[0]['entity'] in (ClientCompany, CompanyBankAccount):
+            return [self.shard_for(ident[0])]
+
+        return [self.names[0]]
+
+    def execute_chooser(self, orm_context) -> List[str]:
+        """
+        The shards of the ids that one of the AND-ed criteria of the statement
+        compares a sharded column to (= or IN), every shard otherwise.
+        Relationships of a loaded instance load from its shard.
+        """
+        if orm_context.lazy_loaded_from is not None:
+            return [orm_context.lazy_loaded_from.identity_token]
+
+        whereclause = getattr(orm_context.statement, 'whereclause', None)
+        if whereclause is None:
+            return self.names
+
+        criteria = whereclause.clauses if is_conjunction(whereclause) else [whereclause]
+        for criterion in criteria:
+            if not (
+                isinstance(criterion, BinaryExpression)
+                and is_sharded_column(criterion.left)
+                and isinstance(criterion.right, BindParameter)
+                and criterion.operator in (operators.eq, operators.in_op)
+            ):
+                continue
+
+            # Primary key loads give the value as a parameter.
+            value = criterion.right.effective_value
+            if value is None and isinstance(orm_context.parameters, dict):
+                value = orm_context.parameters.get(criterion.right.key)
+            if value is None:
+                continue
+
+            ids = value if criterion.operator == operators.in_op else [value]
+            return sorted({self.shard_for(_id) for _id in ids}, key=self.names.index)
+
+        return self.names
+
+    def save_bank(self, code: str, name: str):
+        """
+        Creates or renames the bank on every shard, bumping the versions of the
+        companies with accounts in it, shard by shard. Shards are written one
+        after the other, so on a failure it must be saved again.
+        """
+        for engine in self.engines.values():
+            with engine.begin() as connection:
+                renamed = connection.execute(
+                    update(Bank.__table__).where(Bank.code == code, Bank.name != name).values(name=name)
+                ).rowcount
+                if renamed:
+                    connection.execute(ClientCompany.version_bump(ClientCompany.id.in_(
+                        select(CompanyBankAccount.company_id).where(CompanyBankAccount.bank_code == code)
+                    )))
+                elif connection.execute(select(Bank.id).where(Bank.code == code)).first() is None:
+                    connection.execute(insert(Bank.__table__).values(code=code, name=name))
+
+        self.banks.invalidate()
+
+    def company_page(
+        self,
+        cursor: Optional[int],
+        limit: int,
+        *criteria,
+        fields: Tuple[str, ...] = COMPANY_FIELDS,
+        embed_accounts: bool = True,
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """
+        projections.company_page() over every shard: each shard reads its own
+        page in parallel, and the pages are merged by id, which is global.
+        """
+        statement = company_documents_select(
+            ClientCompany.id.in_(company_page_ids_select(cursor, limit, *criteria)),
+            fields=fields,
+            embed_accounts=embed_accounts,
+        )
+
+        def shard_page(engine: Engine) -> List[Dict]:
+            with engine.connect() as connection:
+                return company_documents(connection.execute(statement), fields, embed_accounts, self.banks)
+
+        pages = self._executor.map(shard_page, self.engines.values())
+        documents = list(islice(heapq.merge(*pages, key=itemgetter('id')), limit + 1))
+
+        return split_page(documents, limit)
+
+
+shards = ShardRouter()
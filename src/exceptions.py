@@ -1,6 +1,8 @@
 from typing import Type
 from werkzeug.exceptions import HTTPException
 
+from src.metrics import record_error
+
 
 class InvalidException(HTTPException):
     code = 400
@@ -11,4 +13,6 @@ class InvalidRequestSchemaError(HTTPException):
 
 
 def handle_bad_request(e: Type[Exception]):
+    record_error(e)
+
     return str(e), 400
@@ -0,0 +1,214 @@
+"""
+Bulk import of companies from NDJSON or CSV files, see `flask import-companies`.
+
+Files are read a line at a time and loaded in chunks of one transaction each,
+through src.database.bulk: COPY on Postgres, executemany on SQLite. After each
+chunk, the number of records done is saved to a checkpoint file, so an
+interrupted import resumes after the last committed chunk. Invalid records, and
+the records of a chunk the database refused, are written to an error file as
+JSON lines, with their record number.
+"""
+import csv
+import json
+import os
+from itertools import groupby, islice
+from operator import itemgetter
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from marshmallow import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+from src.blueprints.company.validator import CompanyImportRecord
+from src.database.bulk import load_companies, sync_banks
+from src.database.cache import bank_cache, company_cache
+from src.database.db import db
+from src.database.models import Bank
+from src.database.projections import COMPANY_FIELDS
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[Dict]:
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Not an object, so rejected by the validation.
+            yield line
+
+
+def csv_account(row: Dict) -> Dict:
+    account = {'agency': row.get('agency'), 'account_number': row.get('account_number')}
+    if row.get('bank_name'):
+        account['bank'] = {'code': row.get('bank_code'), 'name': row['bank_name']}
+    else:
+        account['bank_code'] = row.get('bank_code')
+    return account
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    Companies of a CSV in the layout of the export (EXPORT_CSV_COLUMNS):
+    consecutive lines of the same company id are its bank accounts. Without an
+    id column, each line is a company. Lines with empty account columns add no
+    account.
+    """
+    rows = csv.DictReader(lines)
+    if 'id' in (rows.fieldnames or ()):
+        groups = (list(group) for _, group in groupby(rows, key=itemgetter('id')))
+    else:
+        groups = ([row] for row in rows)
+
+    for group in groups:
+        record = {field: group[0][field] for field in COMPANY_FIELDS if group[0].get(field)}
+        record['bank_accounts'] = [
+            csv_account(row)
+            for row in group
+            if row.get('agency') or row.get('account_number') or row.get('bank_code')
+        ]
+        yield record
+
+
+READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ImportStats:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.started = perf_counter()
+
+    @property
+    def records_per_second(self) -> float:
+        elapsed = perf_counter() - self.started
+        return (self.imported + self.failed) / elapsed if elapsed else 0.0
+
+
+def import_records(
+    records: Iterable[Dict],
+    chunk_size: int,
+    errors: TextIO,
+    skip: int = 0,
+    on_chunk: Optional[Callable[[int, ImportStats], None]] = None,
+) -> ImportStats:
+    """
+    Validates the records with CompanyImportRecord and loads them a chunk per
+    transaction. The first `skip` records are not read into the database, they
+    were by a previous run.
+
+    on_chunk is called after each chunk with the number of records done so
+    far, once the chunk is committed.
+    """
+    loader = CompanyImportRecord()
+    stats = ImportStats()
+    known_banks = set(db.session.scalars(select(Bank.code)))
+
+    def reject(number: int, messages):
+        stats.failed += 1
+        errors.write(json.dumps({'record': number, 'errors': messages}) + '\n')
+
+    numbered = islice(enumerate(records, start=1), skip, None)
+    for chunk in chunks(numbered, chunk_size):
+        valid: List[Tuple[int, Dict]] = []
+        banks: Dict[str, str] = {}
+        for number, record in chunk:
+            try:
+                company = loader.load(record)
+            except ValidationError as e:
+                reject(number, e.messages)
+                continue
+
+            accounts = company.get('bank_accounts') or []
+            record_banks = {
+                account['bank']['code']: account['bank']['name'] for account in accounts if 'bank' in account
+            }
+            unknown = {account['bank_code'] for account in accounts} - known_banks - banks.keys()
+            unknown -= record_banks.keys()
+            if unknown:
+                reject(number, {'bank_accounts': [f'Invalid bank code: {", ".join(sorted(unknown))}.']})
+                continue
+
+            banks.update(record_banks)
+            valid.append((number, company))
+
+        try:
+            sync_banks(banks)
+            load_companies(company for _, company in valid)
+            db.session.commit()
+        except DBAPIError as e:
+            db.session.rollback()
+            for number, _ in valid:
+                reject(number, {'_schema': [f'Not imported, the database refused its chunk: {e.orig}']})
+        else:
+            stats.imported += len(valid)
+            known_banks.update(banks)
+
+        errors.flush()
+        if on_chunk:
+            on_chunk(chunk[-1][0], stats)
+
+    if stats.imported:
+        bank_cache.invalidate()
+        company_cache.clear()
+
+    return stats
+
+
+def read_checkpoint(path: str) -> int:
+    try:
+        with open(path) as checkpoint:
+            return int(checkpoint.read())
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path: str, done: int):
+    # Replaced at once, so an interruption never leaves it half written.
+    with open(f'{path}.tmp', 'w') as checkpoint:
+        checkpoint.write(str(done))
+    os.replace(f'{path}.tmp', path)
+
+
+def import_file(
+    path: str,
+    file_format: str,
+    chunk_size: int,
+    checkpoint_path: str,
+    errors_path: str,
+    restart: bool = False,
+    progress: Callable[[str], None] = print,
+) -> ImportStats:
+    """
+    Imports the file, resuming after the records of its checkpoint unless
+    restarting. The error file is appended to when resuming. The checkpoint is
+    removed once the whole file is imported.
+    """
+    skip = 0 if restart else read_checkpoint(checkpoint_path)
+    if skip:
+        progress(f'Resuming after record {skip}')
+
+    def on_chunk(done: int, stats: ImportStats):
+        write_checkpoint(checkpoint_path, done)
+        progress(
+            f'{done} records: {stats.imported} imported, {stats.failed} failed,'
+            f' {stats.records_per_second:.0f} records/s'
+        )
+
+    with open(path, newline='') as lines, open(errors_path, 'a' if skip else 'w') as errors:
+        stats = import_records(READERS[file_format](lines), chunk_size, errors, skip, on_chunk)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return stats
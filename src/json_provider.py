@@ -0,0 +1,49 @@
+from flask.json.provider import DefaultJSONProvider
+
+from src.profiling import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    DefaultJSONProvider that encodes and decodes with orjson when it's installed.
+
+    The output is byte for byte the same as the default provider: sorted keys,
+    compact separators and the same `default` for Decimal, dates, etc. orjson
+    can't escape non ASCII characters, so documents that have them are encoded
+    again by the default provider.
+    """
+    _compact_dump_args = ({}, {'separators': (',', ':')})
+
+    def dumps(self, obj, **kwargs) -> str:
+        with timed('serialization'):
+            return self._dumps(obj, **kwargs)
+
+    def _dumps(self, obj, **kwargs) -> str:
+        # Indented output (debug) or custom json.dumps arguments use the default.
+        if orjson is None or kwargs not in self._compact_dump_args:
+            return super().dumps(obj, **kwargs)
+
+        encoded = orjson.dumps(
+            obj,
+            default=self.default,
+            option=(
+                orjson.OPT_SORT_KEYS
+                | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATETIME
+            ),
+        )
+        if not encoded.isascii():
+            return super().dumps(obj, **kwargs)
+
+        return encoded.decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
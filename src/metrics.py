@@ -0,0 +1,148 @@
+"""
+Prometheus metrics of the requests, enabled by METRICS_ENABLED and served at
+/metrics: requests and their latency per route, errors, database statements
+and the connection pool.
+
+Each gunicorn worker writes its values to memory mapped files in
+PROMETHEUS_MULTIPROC_DIR, which gunicorn.conf.py sets up before the app is
+imported, and /metrics sums the files of every worker, so it doesn't matter
+which worker answers. Recording a value is a write to the mapped file of the
+worker, no lock between workers nor system call. Without the directory, as in
+development and tests, the values stay in the process.
+"""
+from os import environ
+from time import perf_counter
+
+from flask import current_app, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from werkzeug.exceptions import HTTPException
+
+from src.database.db import db
+
+UNMATCHED_ROUTE = '<unmatched>'
+"""
+Route label of the requests that matched no route, so unknown paths don't make
+new series.
+"""
+
+REQUESTS = Counter(
+    'http_requests_total', 'Requests answered, by route and status.', ['method', 'route', 'status']
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to the response, streamed bodies not included, by route.',
+    ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ERRORS = Counter(
+    'http_request_errors_total',
+    'Invalid requests and unhandled exceptions, by route and exception class.',
+    ['route', 'error'],
+)
+STATEMENTS = Counter(
+    'db_statements_total', 'Statements sent to the database by requests, by route.', ['route']
+)
+POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out', 'Connections in use.', multiprocess_mode='livesum'
+)
+POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Connections open, in use or idle.', multiprocess_mode='livesum'
+)
+POOL_OVERFLOW = Gauge(
+    'db_pool_overflow', 'Connections open over the pool size.', multiprocess_mode='livesum'
+)
+
+
+def route() -> str:
+    return request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+
+
+def is_enabled() -> bool:
+    return has_request_context() and 'metrics' in current_app.extensions
+
+
+def record_error(error: BaseException):
+    """
+    Counts the error of the current request. Does nothing when metrics are
+    disabled.
+    """
+    if is_enabled():
+        ERRORS.labels(route(), type(error).__name__).inc()
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if is_enabled():
+        g.metrics_statements = g.get('metrics_statements', 0) + 1
+
+
+def start_request():
+    g.metrics_started = perf_counter()
+
+
+def record_request(response):
+    method, rule = request.method, route()
+    LATENCY.labels(method, rule).observe(perf_counter() - g.get('metrics_started', perf_counter()))
+    REQUESTS.labels(method, rule, str(response.status_code)).inc()
+
+    statements = g.get('metrics_statements', 0)
+    if statements:
+        STATEMENTS.labels(rule).inc(statements)
+
+    pool = db.engine.pool
+    if isinstance(pool, QueuePool):
+        POOL_CHECKED_OUT.set(pool.checkedout())
+        POOL_CONNECTIONS.set(pool.checkedout() + pool.checkedin())
+        POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    return response
+
+
+def record_http_error(error: HTTPException):
+    """
+    Counts the invalid requests, which the error handler of 400 doesn't get
+    unless they are a BadRequest, and answers them as before.
+    """
+    if error.code == 400:
+        record_error(error)
+
+    return error
+
+
+def record_exception(exception):
+    # Teardown gets the exceptions no error handler took.
+    if exception is not None:
+        record_error(exception)
+
+
+def metrics():
+    """
+    Every worker's metrics, in the Prometheus text format.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', False):
+        return
+
+    app.extensions['metrics'] = True
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.teardown_request(record_exception)
+    app.register_error_handler(HTTPException, record_http_error)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+    # Every engine, the listener skips the apps without metrics.
+    if not event.contains(Engine, 'after_cursor_execute', count_statement):
+        event.listen(Engine, 'after_cursor_execute', count_statement)
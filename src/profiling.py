@@ -0,0 +1,129 @@
+"""
+Opt in per request instrumentation, enabled by PROFILING_ENABLED.
+
+Records the wall time of request validation, database statements (time and
+count, from engine events) and JSON serialization, and sends them in the
+Server-Timing header, e.g.:
+
+    Server-Timing: validation;dur=0.21, db;dur=3.80;desc="4 statements", serialization;dur=0.35, total;dur=6.02
+
+Statements slower than SLOW_QUERY_SECONDS are logged with their parameters
+redacted.
+"""
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REDACTED = '<redacted>'
+
+
+class RequestTimings:
+    """
+    Seconds spent per step of the current request.
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.seconds: Dict[str, float] = {}
+        self.statements = 0
+
+    def add(self, name: str, seconds: float):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        metrics = []
+        for name, seconds in self.seconds.items():
+            metric = f'{name};dur={seconds * 1e3:.2f}'
+            if name == 'db':
+                metric += f';desc="{self.statements} statements"'
+            metrics.append(metric)
+
+        metrics.append(f'total;dur={(perf_counter() - self.started) * 1e3:.2f}')
+        return ', '.join(metrics)
+
+
+def current_timings():
+    if has_app_context():
+        return g.get('timings')
+
+    return None
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Adds the time spent in the block to the current request timings. Does
+    nothing when profiling is disabled.
+    """
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, perf_counter() - started)
+
+
+def redact(parameters, executemany: bool):
+    if executemany:
+        return f'{len(parameters)} parameter sets'
+    if isinstance(parameters, dict):
+        return {key: REDACTED for key in parameters}
+
+    return [REDACTED] * len(parameters or ())
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profiling_started', []).append(perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - conn.info['profiling_started'].pop()
+    if not has_app_context() or 'profiling' not in current_app.extensions:
+        return
+
+    timings = current_timings()
+    if timings is not None:
+        timings.add('db', seconds)
+        timings.statements += 1
+
+    if seconds > current_app.extensions['profiling']['slow_query_seconds']:
+        current_app.logger.warning(
+            'Slow query, %.3f s: %s; parameters: %s',
+            seconds, statement, redact(parameters, executemany),
+        )
+
+
+def start_timings():
+    g.timings = RequestTimings()
+
+
+def add_server_timing(response):
+    timings = current_timings()
+    if timings is not None:
+        response.headers['Server-Timing'] = timings.server_timing()
+
+    return response
+
+
+def init_app(app):
+    if not app.config.get('PROFILING_ENABLED', False):
+        return
+
+    app.extensions['profiling'] = {
+        'slow_query_seconds': app.config.get('SLOW_QUERY_SECONDS', 0.5),
+    }
+    app.before_request(start_timings)
+    app.after_request(add_server_timing)
+
+    # Every engine, the listeners skip the apps without profiling.
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
@@ -0,0 +1,72 @@
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from marshmallow import ValidationError
+
+from src.blueprints.company.validator import CompanyRequest, validate_request_body
+from src.exceptions import InvalidRequestSchemaError
+
+
+def test_validate_request_body_gives_loaded_body(app):
+    # Given
+    @validate_request_body(schema=CompanyRequest)
+    def view(body):
+        return body
+
+    request_body = {
+        'company_name': 'My Company',
+        'phone': '11978235674',
+        'declared_billing': 123.02,
+    }
+
+    # When
+    with app.test_request_context(json=request_body):
+        body = view()
+
+    # Then
+    assert body == {
+        'company_name': 'My Company',
+        'phone': '11978235674',
+        'declared_billing': Decimal('123.02'),
+    }
+
+
+def test_validate_request_body_builds_schema_once(app):
+    # Given
+    with mock.patch.object(CompanyRequest, '__init__', return_value=None) as init:
+        @validate_request_body(schema=CompanyRequest)
+        def view(body):
+            return body
+
+    # When
+    with mock.patch.object(CompanyRequest, 'load', return_value={}):
+        for _ in range(3):
+            with app.test_request_context(json={}):
+                view()
+
+    # Then
+    assert init.call_count == 1
+
+
+def test_validate_request_body_invalid(app):
+    # Given
+    @validate_request_body(schema=CompanyRequest)
+    def view(body):
+        return body
+
+    # When / Then
+    with app.test_request_context(json={'phone': 'ak-47'}):
+        with pytest.raises(InvalidRequestSchemaError):
+            view()
+
+
+@pytest.mark.parametrize('phone', ['08001234567', '0011978235674'])
+def test_company_request_keeps_phone_unchanged(phone):
+    assert CompanyRequest().load({'phone': phone}) == {'phone': phone}
+
+
+@pytest.mark.parametrize('phone', ['+5511978235674', '11 97823-5674', '1' * 16, 11978235674])
+def test_company_request_invalid_phone(phone):
+    with pytest.raises(ValidationError):
+        CompanyRequest().load({'phone': phone})
@@ -1,7 +1,12 @@
+import csv
+import io
 import pytest
 from decimal import Decimal
 
-from src.database.models import ClientCompany, CompanyBankAccount
+from src.blueprints.company import views
+from src.database.cache import company_cache
+from src.database.db import db
+from src.database.models import BankBillingSummary, ClientCompany, CompanyBankAccount, CompanyChange
 
 
 @pytest.fixture
@@ -119,13 +124,14 @@ def test_create_company_with_bank_account(http_client, fake_now):
 
 def test_delete_company(http_client, fake_now, company_with_bank):
     # Given
-    path = f'/company/{company_with_bank.id}'
+    _id = company_with_bank.id
+    path = f'/company/{_id}'
 
     # When
     http_client.delete(path)
 
     # Then
-    assert ClientCompany.query.get(company_with_bank.id) is None
+    assert ClientCompany.query.get(_id) is None
 
 
 def test_update_company(http_client, fake_now, company_with_bank):
@@ -269,3 +275,813 @@ def test_invalid_create_company(http_client, broken_field):
 
     # Then
     assert response.status_code == 400
+
+
+def test_get_company_query_count(http_client, assert_num_queries):
+    """
+    The amount of queries to read a company must not grow with its bank accounts.
+    """
+    # Given
+    from src.tests.data.banks import bank_list
+
+    company = ClientCompany(
+        company_name='company with many accounts',
+        phone='11978235674',
+        declared_billing=Decimal('10.00'),
+        bank_accounts=[
+            CompanyBankAccount(agency='0001', account_number=str(i), bank_code=bank['code'])
+            for i, bank in enumerate(bank_list[:20])
+        ],
+    )
+    company.save()
+    path = f'/company/{company.id}'
+
+    # When
+    with assert_num_queries(1):
+        response = http_client.get(path)
+
+    # Then
+    assert response.status_code == 200
+    assert len(response.json['bank_accounts']) == 20
+
+
+@pytest.fixture
+def company_ids():
+    companies = [
+        ClientCompany(
+            company_name=f'listed company {i}',
+            phone='11978235674',
+            declared_billing=Decimal('10.00'),
+            bank_accounts=[
+                CompanyBankAccount(agency='0001', account_number=str(i), bank_code='044')
+            ],
+        )
+        for i in range(3)
+    ]
+    for company in companies:
+        company.save()
+
+    return [company.id for company in companies]
+
+
+def test_list_companies(http_client, company_ids):
+    # Given
+    cursor = company_ids[0] - 1
+    path = f'/company/?cursor={cursor}&limit=2'
+
+    # When
+    first_page = http_client.get(path).json
+    second_page = http_client.get(
+        f'/company/?cursor={first_page["next_cursor"]}&limit=2'
+    ).json
+
+    # Then
+    assert [c['company_name'] for c in first_page['results']] == [
+        'listed company 0', 'listed company 1'
+    ]
+    assert first_page['next_cursor'] == company_ids[1]
+    assert first_page['results'][0]['bank_accounts'][0]['bank']['code'] == '044'
+
+    assert [c['company_name'] for c in second_page['results']] == ['listed company 2']
+    assert second_page['next_cursor'] is None
+
+
+def test_list_companies_page_size_cap(app, monkeypatch, http_client, company_ids):
+    # Given
+    path = f'/company/?cursor={company_ids[0] - 1}&limit=1000'
+    monkeypatch.setitem(app.config, 'COMPANY_PAGE_SIZE_MAX', 2)
+
+    # When
+    response = http_client.get(path)
+
+    # Then
+    assert len(response.json['results']) == 2
+    assert response.json['next_cursor'] == company_ids[1]
+
+
+def test_list_companies_query_count(http_client, assert_num_queries, company_ids):
+    # Given
+    path = '/company/?limit=500'
+
+    # When
+    with assert_num_queries(1):
+        response = http_client.get(path)
+
+    # Then
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('query_string', ['cursor=abc', 'limit=0', 'limit=-1'])
+def test_list_companies_invalid_params(http_client, query_string):
+    # When
+    response = http_client.get(f'/company/?{query_string}')
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_bulk_create_companies(app, monkeypatch, http_client):
+    # Given
+    path = '/company/bulk'
+    request_body = [
+        {
+            'company_name': 'bulk company 0',
+            'phone': '11978235674',
+            'declared_billing': 10.5,
+            'bank_accounts': [
+                {'account_number': '1', 'agency': '0001', 'bank_code': '336'},
+                {'account_number': '2', 'agency': '0001', 'bank_code': '044'},
+            ]
+        },
+        {'company_name': 'bulk company 1', 'phone': 'ak-47', 'declared_billing': 1},
+        {'company_name': 'bulk company 2', 'phone': '11978235674', 'declared_billing': 2},
+    ]
+    monkeypatch.setitem(app.config, 'COMPANY_BULK_CHUNK_SIZE', 1)
+
+    # When
+    response = http_client.post(path, json=request_body)
+
+    # Then
+    ids = response.json['ids']
+    assert response.status_code == 200
+    assert ids[1] is None
+    assert list(response.json['errors']) == ['1']
+
+    first, third = ClientCompany.query.get(ids[0]), ClientCompany.query.get(ids[2])
+    assert first.company_name == 'bulk company 0'
+    assert first.declared_billing == Decimal('10.50')
+    assert sorted(acc.bank_code for acc in first.bank_accounts) == ['044', '336']
+    assert third.company_name == 'bulk company 2'
+    assert ClientCompany.query.filter_by(company_name='bulk company 1').count() == 0
+
+
+def test_bulk_create_companies_loads_valid_items(http_client):
+    """
+    Valid items go through the whole schema even when other items are invalid.
+    """
+    # Given
+    request_body = [
+        {'company_name': 'bulk loaded company', 'phone': '11978235674', 'declared_billing': 1},
+        {'company_name': 'bulk invalid company', 'phone': 'ak-47', 'declared_billing': 1},
+    ]
+
+    # When
+    response = http_client.post('/company/bulk', json=request_body)
+
+    # Then
+    company = ClientCompany.query.get(response.json['ids'][0])
+    assert company.phone == '11978235674'
+    assert list(response.json['errors']) == ['1']
+
+
+def test_bulk_create_companies_database_errors(app, monkeypatch, http_client):
+    """
+    A chunk refused by the database is reported, the other chunks are created.
+    """
+    # Given
+    duplicated_account = {'account_number': '1', 'agency': '0001', 'bank_code': '336'}
+    request_body = [
+        {'company_name': 'bulk chunk 0', 'phone': '1', 'declared_billing': 1},
+        {
+            'company_name': 'bulk chunk 1',
+            'phone': '1',
+            'declared_billing': 1,
+            'bank_accounts': [duplicated_account, duplicated_account],
+        },
+        {
+            'company_name': 'bulk chunk 2',
+            'phone': '1',
+            'declared_billing': 1,
+            'bank_accounts': [{'account_number': '1', 'agency': '0001', 'bank_code': '000'}],
+        },
+        {'company_name': 'bulk chunk 3', 'phone': '1', 'declared_billing': 1},
+    ]
+    monkeypatch.setitem(app.config, 'COMPANY_BULK_CHUNK_SIZE', 1)
+
+    # When
+    response = http_client.post('/company/bulk', json=request_body)
+
+    # Then
+    ids = response.json['ids']
+    assert response.status_code == 200
+    assert ids[1] is None and ids[2] is None
+    assert sorted(response.json['errors']) == ['1', '2']
+    assert response.json['errors']['2'] == {'bank_accounts': ['Invalid bank code.']}
+    assert ClientCompany.query.get(ids[0]).company_name == 'bulk chunk 0'
+    assert ClientCompany.query.get(ids[3]).company_name == 'bulk chunk 3'
+    assert ClientCompany.query.filter_by(company_name='bulk chunk 1').count() == 0
+
+
+def test_bulk_create_companies_not_a_list(http_client):
+    # When
+    response = http_client.post('/company/bulk', json={'company_name': 'not a list'})
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_get_company_etag(http_client, company_with_bank, assert_num_queries):
+    """
+    Cached reads only check the version of the company.
+    """
+    # Given
+    path = f'/company/{company_with_bank.id}'
+    first_response = http_client.get(path)
+    etag = first_response.headers['ETag']
+
+    # When
+    with assert_num_queries(2) as statements:
+        cached_response = http_client.get(path)
+        not_modified_response = http_client.get(path, headers={'If-None-Match': etag})
+
+    # Then
+    assert cached_response.data == first_response.data
+    assert cached_response.headers['ETag'] == etag
+    assert not_modified_response.status_code == 304
+    assert not_modified_response.data == b''
+    assert all(statement.startswith('SELECT client_company.version') for statement in statements)
+
+
+@pytest.mark.parametrize(
+    'method, path, body',
+    [
+        ('put', '/company/{company_id}', {'company_name': 'New name'}),
+        (
+            'post',
+            '/company/{company_id}/bank_account',
+            {'agency': '1', 'account_number': '2', 'bank_code': '237'}
+        ),
+        ('put', '/company/account/{account_id}', {'agency': '54321'}),
+        ('delete', '/company/account/{account_id}', None),
+        ('delete', '/company/{company_id}', None),
+    ]
+)
+def test_get_company_cache_invalidation(http_client, company_with_bank, method, path, body):
+    # Given
+    company_path = f'/company/{company_with_bank.id}'
+    path = path.format(
+        company_id=company_with_bank.id,
+        account_id=company_with_bank.bank_accounts[0].id,
+    )
+    etag = http_client.get(company_path).headers['ETag']
+
+    # When
+    getattr(http_client, method)(path, json=body)
+    response = http_client.get(company_path, headers={'If-None-Match': etag})
+
+    # Then
+    assert response.status_code != 304
+
+
+@pytest.mark.parametrize(
+    'method, path',
+    [
+        ('post', '/company/{company_id}/bank_account'),
+        ('put', '/company/account/{account_id}'),
+    ]
+)
+def test_invalid_bank_account(http_client, company_with_bank, method, path):
+    # Given
+    path = path.format(
+        company_id=company_with_bank.id,
+        account_id=company_with_bank.bank_accounts[0].id,
+    )
+    request_body = {'bank_code': '12345'}
+
+    # When
+    response = getattr(http_client, method)(path, json=request_body)
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_add_bank_account_query_count(http_client, assert_num_queries):
+    """
+    Adding an account is one insert, the version bump, the billing summary
+    upsert and the change record, no matter how many accounts the company has.
+    """
+    # Given
+    from src.tests.data.banks import bank_list
+
+    company = ClientCompany(
+        company_name='company with many accounts',
+        phone='11978235674',
+        declared_billing=Decimal('10.00'),
+        bank_accounts=[
+            CompanyBankAccount(agency='0001', account_number=str(i), bank_code=bank['code'])
+            for i, bank in enumerate(bank_list[:20])
+        ],
+    )
+    company.save()
+    path = f'/company/{company.id}/bank_account'
+    request_body = {'agency': '0002', 'account_number': '1', 'bank_code': bank_list[20]['code']}
+
+    # Requests start with an empty session, nothing is loaded yet.
+    ClientCompany.query.session.expunge_all()
+
+    # When
+    with assert_num_queries(6) as statements:
+        response = http_client.post(path, json=request_body)
+
+    # Then
+    assert response.status_code == 200
+    assert statements[2].startswith('INSERT INTO bank_billing_summary')
+    assert statements[3].startswith('INSERT INTO company_change')
+    assert statements[4].startswith('UPDATE client_company SET version')
+    assert statements[5].startswith('INSERT INTO company_bank_account')
+
+
+def test_update_account_to_duplicate(http_client, company_with_bank):
+    # Given
+    new_account = CompanyBankAccount(agency='1', account_number='1', bank_code='044')
+    company_with_bank.add_bank_account(new_account)
+    new_account_id = new_account.id
+
+    path = f'/company/account/{new_account_id}'
+    update_body = {'agency': '123245', 'account_number': '92834-9'}
+
+    # When
+    response = http_client.put(path, json=update_body)
+
+    # Then
+    assert response.status_code == 400
+    assert CompanyBankAccount.query.get(new_account_id).agency == '1'
+
+
+@pytest.fixture
+def searchable_company_ids():
+    companies = [
+        ClientCompany(
+            company_name=name,
+            phone=phone,
+            declared_billing=Decimal('10.00'),
+        )
+        for name, phone in [
+            ('Zeta Search One', '5599000001'),
+            ('zeta search two', '5599000002'),
+            ('Another Zeta', '5588000003'),
+        ]
+    ]
+    for company in companies:
+        company.save()
+
+    return [company.id for company in companies]
+
+
+@pytest.mark.parametrize(
+    'q, expected_indexes',
+    [
+        ('ZETA SEARCH', [0, 1]),
+        ('zeta search t', [1]),
+        ('559900', [0, 1]),
+        ('5588000003', [2]),
+        ('Zeta%', []),
+        ('_eta', []),
+    ]
+)
+def test_search_companies(http_client, searchable_company_ids, q, expected_indexes):
+    # Given
+    cursor = searchable_company_ids[0] - 1
+
+    # When
+    response = http_client.get('/company/search', query_string={'q': q, 'cursor': cursor})
+
+    # Then
+    assert [company['id'] for company in response.json['results']] == [
+        searchable_company_ids[i] for i in expected_indexes
+    ]
+
+
+def test_search_companies_paginated(http_client, searchable_company_ids):
+    # Given
+    query_string = {'q': 'zeta', 'limit': 1, 'cursor': searchable_company_ids[0] - 1}
+
+    # When
+    response = http_client.get('/company/search', query_string=query_string)
+
+    # Then
+    assert len(response.json['results']) == 1
+    assert response.json['next_cursor'] == searchable_company_ids[0]
+
+
+@pytest.mark.parametrize('query_string', [{}, {'q': ''}, {'q': 'a', 'limit': 0}])
+def test_search_companies_invalid_params(http_client, query_string):
+    # When
+    response = http_client.get('/company/search', query_string=query_string)
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_get_company_changed_by_another_worker(http_client, company_with_bank):
+    """
+    A change committed by another worker doesn't invalidate this worker's cache,
+    the version check must catch it.
+    """
+    # Given
+    path = f'/company/{company_with_bank.id}'
+    etag = http_client.get(path).headers['ETag']
+
+    ClientCompany.query.filter_by(id=company_with_bank.id).update({
+        'company_name': 'Renamed elsewhere',
+        'version': ClientCompany.version + 1,
+    })
+    ClientCompany.query.session.commit()
+
+    # When
+    response = http_client.get(path, headers={'If-None-Match': etag})
+
+    # Then
+    assert response.status_code == 200
+    assert response.json['company_name'] == 'Renamed elsewhere'
+    assert response.headers['ETag'] != etag
+
+
+def test_get_company_stale_document_cached_after_write(http_client, company_with_bank):
+    """
+    A reader that loaded the document before a write and caches it after the
+    write's invalidation must not get the stale document served.
+    """
+    # Given
+    path = f'/company/{company_with_bank.id}'
+    stale_response = http_client.get(path)
+    stale_etag = stale_response.headers['ETag']
+    http_client.put(path, json={'company_name': 'Written name'})
+
+    # When
+    company_cache.set(company_with_bank.id, stale_etag.strip('"'), stale_response.data, 1)
+    response = http_client.get(path)
+
+    # Then
+    assert response.json['company_name'] == 'Written name'
+    assert response.headers['ETag'] != stale_etag
+
+
+def test_create_company_phone_with_leading_zero(http_client):
+    # Given
+    request_body = {
+        'company_name': 'Company with toll free phone',
+        'phone': '08001234567',
+        'declared_billing': 1,
+    }
+
+    # When
+    http_client.post('/company/', json=request_body)
+
+    # Then
+    company = ClientCompany.query.filter_by(company_name='Company with toll free phone').one()
+    assert company.phone == '08001234567'
+
+
+def test_update_company_resubmitting_accounts(http_client, company_with_bank):
+    """
+    Resubmitting the accounts a company already has doesn't duplicate them.
+    """
+    # Given
+    company_id = company_with_bank.id
+    path = f'/company/{company_id}'
+    registered_account = {'agency': '123245', 'account_number': '92834-9', 'bank_code': '044'}
+    new_account = {'agency': '1', 'account_number': '1', 'bank_code': '237'}
+    request_body = {
+        'company_name': 'Resubmitted company',
+        'bank_accounts': [registered_account, new_account, new_account],
+    }
+
+    # When
+    response = http_client.put(path, json=request_body)
+
+    # Then
+    accounts = CompanyBankAccount.query.filter_by(company_id=company_id).all()
+    assert response.status_code == 200
+    assert sorted((account.bank_code, account.agency) for account in accounts) == [
+        ('044', '123245'), ('237', '1'),
+    ]
+
+
+def test_update_company_sync_accounts(http_client, company_with_bank, assert_num_queries):
+    """
+    Synced accounts are diffed against the stored ones: only the missing ones are
+    inserted and only the ones left out are deleted.
+    """
+    # Given
+    company_id = company_with_bank.id
+    path = f'/company/{company_id}?sync_accounts=true'
+    kept_account = {'agency': '0001', 'account_number': '1', 'bank_code': '237'}
+    http_client.put(f'/company/{company_id}', json={'bank_accounts': [kept_account]})
+    new_account = {'agency': '0002', 'account_number': '2', 'bank_code': '336'}
+    ClientCompany.query.session.expunge_all()
+
+    # When
+    with assert_num_queries(8) as statements:
+        response = http_client.put(path, json={'bank_accounts': [kept_account, new_account]})
+
+    # Then
+    accounts = CompanyBankAccount.query.filter_by(company_id=company_id).all()
+    assert response.status_code == 200
+    assert sorted(account.bank_code for account in accounts) == ['237', '336']
+    assert [statement.split()[0] for statement in statements] == [
+        'SELECT', 'SELECT', 'INSERT', 'SELECT', 'DELETE', 'INSERT', 'INSERT', 'UPDATE',
+    ]
+
+
+def test_update_company_sync_same_accounts(http_client, company_with_bank, assert_num_queries):
+    # Given
+    company_id = company_with_bank.id
+    path = f'/company/{company_id}?sync_accounts=true'
+    registered_account = {'agency': '123245', 'account_number': '92834-9', 'bank_code': '044'}
+    ClientCompany.query.session.expunge_all()
+
+    # When
+    with assert_num_queries(5) as statements:
+        response = http_client.put(path, json={'bank_accounts': [registered_account]})
+
+    # Then
+    assert response.status_code == 200
+    assert CompanyBankAccount.query.filter_by(company_id=company_id).count() == 1
+    assert not any(
+        statement.startswith(('INSERT INTO company_bank_account', 'DELETE')) for statement in statements
+    )
+
+
+def test_update_company_sync_without_accounts_keeps_them(http_client, company_with_bank):
+    # Given
+    company_id = company_with_bank.id
+
+    # When
+    response = http_client.put(
+        f'/company/{company_id}?sync_accounts=true', json={'company_name': 'Only renamed'}
+    )
+
+    # Then
+    assert response.status_code == 200
+    assert CompanyBankAccount.query.filter_by(company_id=company_id).count() == 1
+
+
+def test_get_company_fields(http_client, company_with_bank):
+    # Given
+    path = f'/company/{company_with_bank.id}'
+
+    # When
+    whole = http_client.get(path)
+    sparse = http_client.get(f'{path}?fields=company_name,phone')
+    embedded = http_client.get(f'{path}?fields=company_name&embed=bank_accounts')
+
+    # Then
+    assert sparse.json == {
+        'company_name': 'my company', 'phone': '(11) 95874-4568', 'id': company_with_bank.id,
+    }
+    assert sorted(embedded.json) == ['bank_accounts', 'company_name', 'id']
+    assert embedded.json['bank_accounts'] == whole.json['bank_accounts']
+    assert len({whole.headers['ETag'], sparse.headers['ETag'], embedded.headers['ETag']}) == 3
+
+
+def test_get_company_without_accounts(http_client, company_with_bank):
+    # When
+    response = http_client.get(f'/company/{company_with_bank.id}?embed=')
+
+    # Then
+    assert 'bank_accounts' not in response.json
+    assert 'declared_billing' in response.json
+
+
+@pytest.mark.parametrize('query', ['fields=company_name,password', 'fields=', 'embed=bank'])
+def test_get_company_invalid_fields(http_client, company_with_bank, query):
+    # When
+    response = http_client.get(f'/company/{company_with_bank.id}?{query}')
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_list_companies_fields(http_client, company_ids):
+    # When
+    response = http_client.get(f'/company/?cursor={company_ids[0] - 1}&limit=2&fields=phone')
+
+    # Then
+    assert [sorted(company) for company in response.json['results']] == [['id', 'phone']] * 2
+
+
+def test_delete_company_cascades_in_one_statement(http_client, assert_num_queries):
+    # Given
+    company = ClientCompany(
+        company_name='company deleted with its accounts',
+        phone='11978235674',
+        declared_billing=Decimal('10.00'),
+        bank_accounts=[
+            CompanyBankAccount(agency='0001', account_number=str(i), bank_code='237')
+            for i in range(20)
+        ],
+    )
+    company.save()
+    company_id = company.id
+    ClientCompany.query.session.expunge_all()
+
+    # When
+    with assert_num_queries(4) as statements:
+        response = http_client.delete(f'/company/{company_id}')
+
+    # Then
+    assert response.status_code == 200
+    assert [statement.split()[0] for statement in statements] == ['SELECT', 'INSERT', 'INSERT', 'DELETE']
+    assert CompanyBankAccount.query.filter_by(company_id=company_id).count() == 0
+
+
+def test_delete_company_not_found(http_client):
+    # When
+    response = http_client.delete('/company/999999')
+
+    # Then
+    assert response.status_code == 404
+
+
+def test_bulk_delete_companies(http_client, company_ids):
+    # When
+    response = http_client.delete(f'/company/?ids={company_ids[0]},{company_ids[1]},999999')
+
+    # Then
+    assert response.status_code == 200
+    assert response.json == {'deleted': 2}
+    assert ClientCompany.query.filter(ClientCompany.id.in_(company_ids)).count() == 1
+
+
+@pytest.mark.parametrize('query', ['', 'ids=', 'ids=1,a', 'ids=' + ','.join(['1'] * 501)])
+def test_bulk_delete_companies_invalid(http_client, query):
+    # When
+    response = http_client.delete(f'/company/?{query}')
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_export_companies_ndjson(app, http_client, company_with_bank):
+    # Given
+    expected = [
+        app.json.loads(app.json.dumps(company.serialize()))
+        for company in ClientCompany.query.order_by(ClientCompany.id)
+    ]
+    for document in expected:
+        document['bank_accounts'].sort(key=lambda account: account['id'])
+
+    # When
+    response = http_client.get('/company/export')
+
+    # Then
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert [app.json.loads(line) for line in lines] == expected
+
+
+def test_export_companies_csv(http_client, company_with_bank):
+    # Given
+    company_id = company_with_bank.id
+    ClientCompany.query.session.expunge_all()
+
+    # When
+    response = http_client.get('/company/export?format=csv')
+
+    # Then
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert {
+        key: value for key, value in rows[-1].items() if key != 'bank_account_id'
+    } == {
+        'id': str(company_id),
+        'company_name': 'my company',
+        'phone': '(11) 95874-4568',
+        'created': '2022-08-08T12:00:00',
+        'declared_billing': '1235.69',
+        'agency': '123245',
+        'account_number': '92834-9',
+        'bank_code': '044',
+        'bank_name': 'Banco BVA',
+    }
+
+
+def test_export_companies_invalid_format(http_client):
+    # When
+    response = http_client.get('/company/export?format=xml')
+
+    # Then
+    assert response.status_code == 400
+
+
+def test_company_stats(http_client):
+    # Given
+    BankBillingSummary.rebuild()
+    before = {bank['code']: bank for bank in http_client.get('/company/stats').json['banks']}
+    http_client.post('/company/', json={
+        'company_name': 'company in the stats',
+        'phone': '11978235674',
+        'declared_billing': '100.00',
+        'bank_accounts': [
+            {'agency': '0001', 'account_number': '1', 'bank_code': '237'},
+            {'agency': '0001', 'account_number': '2', 'bank_code': '237'},
+        ],
+    })
+
+    # When
+    response = http_client.get('/company/stats')
+
+    # Then
+    assert response.status_code == 200
+    bradesco = next(bank for bank in response.json['banks'] if bank['code'] == '237')
+    previous = before.get('237', {'company_count': 0, 'total_billing': '0'})
+    assert bradesco['name'] == 'Banco Bradesco'
+    assert bradesco['company_count'] == previous['company_count'] + 1
+    assert Decimal(bradesco['total_billing']) == Decimal(previous['total_billing']) + Decimal('100.00')
+
+
+def last_change() -> int:
+    return db.session.execute(db.select(db.func.max(CompanyChange.id))).scalar() or 0
+
+
+def test_company_changes(http_client, company_with_bank):
+    # Given
+    company_id = company_with_bank.id
+    since = last_change()
+    http_client.put(f'/company/{company_id}', json={'company_name': 'changed company'})
+    http_client.post(f'/company/{company_id}/bank_account', json={
+        'agency': '0001', 'account_number': '1', 'bank_code': '237',
+    })
+    http_client.delete(f'/company/{company_id}')
+
+    # When
+    response = http_client.get(f'/company/changes?since={since}')
+
+    # Then
+    assert response.status_code == 200
+    changes = response.json['changes']
+    assert [(change['company_id'], change['operation']) for change in changes] == [
+        (company_id, 'update'), (company_id, 'update'), (company_id, 'delete'),
+    ]
+    assert [change['seq'] for change in changes] == list(range(since + 1, since + 4))
+    assert response.json['next_since'] == changes[-1]['seq']
+
+
+def test_company_changes_create_and_pages(http_client):
+    # Given
+    since = last_change()
+    for i in range(3):
+        http_client.post('/company/', json={
+            'company_name': f'company of the feed {i}', 'phone': '11978235674', 'declared_billing': '1.00',
+        })
+
+    # When
+    first_page = http_client.get(f'/company/changes?since={since}&limit=2').json
+    second_page = http_client.get(f'/company/changes?since={first_page["next_since"]}&limit=2').json
+
+    # Then
+    changes = first_page['changes'] + second_page['changes']
+    assert [len(first_page['changes']), len(second_page['changes'])] == [2, 1]
+    assert {change['operation'] for change in changes} == {'create'}
+    assert [
+        ClientCompany.query.get(change['company_id']).company_name for change in changes
+    ] == [f'company of the feed {i}' for i in range(3)]
+
+
+def test_company_changes_waits_for_changes(monkeypatch, http_client, company_with_bank):
+    # Given
+    since = last_change()
+    company_id = company_with_bank.id
+
+    def change_meanwhile(seconds):
+        CompanyChange.record('update', [company_id])
+        db.session.commit()
+
+    monkeypatch.setattr(views, 'sleep', change_meanwhile)
+
+    # When
+    response = http_client.get(f'/company/changes?since={since}&wait=10')
+
+    # Then
+    assert [(change['company_id'], change['operation']) for change in response.json['changes']] == [
+        (company_id, 'update'),
+    ]
+
+
+def test_company_changes_wait_times_out(app, monkeypatch, http_client):
+    # Given
+    since = last_change()
+    sleeps = []
+    monkeypatch.setattr(views, 'sleep', sleeps.append)
+    monkeypatch.setitem(app.config, 'CHANGE_FEED_POLL_SECONDS', 0.5)
+    monkeypatch.setitem(app.config, 'CHANGE_FEED_MAX_WAIT_SECONDS', 2)
+
+    # When
+    response = http_client.get(f'/company/changes?since={since}&wait=60')
+
+    # Then
+    assert response.json == {'changes': [], 'next_since': since}
+    assert sleeps == [0.5] * 4
+
+
+@pytest.mark.parametrize('query_string', ['since=-1', 'since=abc', 'limit=0', 'wait=-1'])
+def test_company_changes_invalid_params(http_client, query_string):
+    # When
+    response = http_client.get(f'/company/changes?{query_string}')
+
+    # Then
+    assert response.status_code == 400
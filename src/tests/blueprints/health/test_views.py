@@ -0,0 +1,26 @@
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+
+def test_health(http_client):
+    # When
+    response = http_client.get('/health')
+
+    # Then
+    assert response.status_code == 200
+    assert response.json['database'] == 'ok'
+    assert 'class' in response.json['pool']
+
+
+def test_health_database_unavailable(http_client):
+    # Given
+    error = OperationalError('SELECT 1', {}, Exception('connection refused'))
+
+    # When
+    with mock.patch('src.blueprints.health.views.db.session.execute', side_effect=error):
+        response = http_client.get('/health')
+
+    # Then
+    assert response.status_code == 503
+    assert response.json['database'] == 'unavailable'
@@ -1,6 +1,8 @@
+from contextlib import contextmanager
 from datetime import datetime
 
 import pytest
+from sqlalchemy import event
 
 
 TEST_DATABASE = 'usercrud_test'
@@ -14,12 +16,12 @@ def fake_now(freezer):
 
 @pytest.fixture(scope='session')
 def app():
-    from src import app
-    from src.database.db import db, init_from_app
-
-    app.config.from_pyfile('/app/config/local.py')
+    from src import create_app
+    from src.database.db import db
 
-    init_from_app(app)
+    app = create_app('/app/config/local.py')
+    context = app.app_context()
+    context.push()
 
     db.drop_all()
     db.create_all()
@@ -30,12 +32,14 @@ def app():
     # After tests are done, this function should resume
     db.session.close()
     db.drop_all()
+    context.pop()
 
 
 @pytest.fixture(
     scope='session', autouse=True
 )
 def banks(app):
+    from src.database.cache import bank_cache
     from src.database.db import db
     from src.database.models import Bank
     from src.tests.data.banks import bank_list
@@ -44,7 +48,51 @@ def banks(app):
     db.session.add_all(obj_list)
     db.session.commit()
 
+    bank_cache.load()
+
+
+@pytest.fixture(autouse=True)
+def remove_session(app):
+    """
+    Each test starts with an empty session, like each request does. Objects of
+    rows deleted by a previous test, whose ids SQLite hands out again, are left
+    behind otherwise.
+    """
+    from src.database.db import db
+
+    yield
+    db.session.remove()
+
 
 @pytest.fixture
 def http_client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def assert_num_queries(app):
+    """
+    Asserts how many statements are sent to the database inside the block.
+
+    Usage:
+        with assert_num_queries(2):
+            http_client.get(path)
+    """
+    from src.database.db import db
+
+    @contextmanager
+    def _assert_num_queries(expected: int):
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+        assert len(statements) == expected, '\n\n'.join(statements)
+
+    return _assert_num_queries
@@ -0,0 +1,132 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from src.database.db import db
+from src.database.models import Bank, ClientCompany, CompanyBankAccount
+
+
+def company_record(name: str, **kwargs):
+    record = {
+        'company_name': name,
+        'phone': '11978235674',
+        'declared_billing': '1235.69',
+        'bank_accounts': [{'agency': '0001', 'account_number': '1', 'bank_code': '237'}],
+    }
+    record.update(kwargs)
+    return record
+
+
+def write_ndjson(path, records):
+    path.write_text(''.join(
+        (record if isinstance(record, str) else json.dumps(record)) + '\n' for record in records
+    ))
+    return path
+
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+
+def test_import_companies_ndjson(runner, tmp_path):
+    # Given
+    path = write_ndjson(tmp_path / 'companies.ndjson', [
+        company_record('imported company 1'),
+        company_record('imported company 2', bank_accounts=[
+            {'agency': '0001', 'account_number': '1', 'bank': {'code': '901', 'name': 'Imported Bank'}},
+            {'agency': '0001', 'account_number': '1', 'bank': {'code': '901', 'name': 'Imported Bank'}},
+        ]),
+        company_record('imported company 3', phone=None),
+        company_record('imported company 4', bank_accounts=[
+            {'agency': '0001', 'account_number': '1', 'bank_code': '902'},
+        ]),
+        'not json',
+    ])
+
+    # When
+    result = runner.invoke(args=['import-companies', str(path), '--chunk-size', '2'])
+
+    # Then
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[-1] == '2 imported, 3 failed'
+
+    imported = ClientCompany.query.filter(ClientCompany.company_name.like('imported company %')).all()
+    assert sorted(company.company_name for company in imported) == ['imported company 1', 'imported company 2']
+    assert {company.company_name: len(company.bank_accounts) for company in imported} == {
+        'imported company 1': 1, 'imported company 2': 1
+    }
+    assert Bank.query.filter_by(code='901').one().name == 'Imported Bank'
+
+    errors = [json.loads(line) for line in (tmp_path / 'companies.ndjson.errors').read_text().splitlines()]
+    assert [error['record'] for error in errors] == [3, 4, 5]
+    assert errors[0]['errors'] == {'phone': ['Field may not be null.']}
+    assert errors[1]['errors'] == {'bank_accounts': ['Invalid bank code: 902.']}
+    assert not (tmp_path / 'companies.ndjson.checkpoint').exists()
+
+
+def test_import_companies_csv(runner, tmp_path):
+    # Given
+    path = tmp_path / 'companies.csv'
+    path.write_text(
+        'id,company_name,phone,created,declared_billing,bank_account_id,agency,account_number,bank_code,bank_name\n'
+        '1,csv company 1,11978235674,2022-08-08T12:00:00,10.00,1,0001,1,237,Banco Bradesco\n'
+        '1,csv company 1,11978235674,2022-08-08T12:00:00,10.00,2,0001,2,237,Banco Bradesco\n'
+        '2,csv company 2,11978235674,2022-08-08T12:00:00,10.00,,,,,\n'
+    )
+
+    # When
+    result = runner.invoke(args=['import-companies', str(path)])
+
+    # Then
+    assert result.exit_code == 0, result.output
+    imported = ClientCompany.query.filter(ClientCompany.company_name.like('csv company %')).all()
+    assert {company.company_name: len(company.bank_accounts) for company in imported} == {
+        'csv company 1': 2, 'csv company 2': 0
+    }
+    assert imported[0].declared_billing == Decimal('10.00')
+
+
+def test_import_companies_resumes_after_checkpoint(runner, tmp_path):
+    # Given
+    path = write_ndjson(tmp_path / 'resumed.ndjson', [
+        company_record(f'resumed company {i}') for i in range(1, 5)
+    ])
+    (tmp_path / 'resumed.ndjson.checkpoint').write_text('2')
+
+    # When
+    result = runner.invoke(args=['import-companies', str(path), '--chunk-size', '1'])
+
+    # Then
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[0] == 'Resuming after record 2'
+    imported = ClientCompany.query.filter(ClientCompany.company_name.like('resumed company %'))
+    assert sorted(company.company_name for company in imported) == ['resumed company 3', 'resumed company 4']
+
+
+def test_import_companies_renaming_bank_bumps_versions(runner, tmp_path):
+    # Given
+    db.session.add(Bank(code='903', name='Old Name'))
+    company = ClientCompany(
+        company_name='company of a renamed bank',
+        phone='11978235674',
+        declared_billing=Decimal('10.00'),
+        bank_accounts=[CompanyBankAccount(agency='0001', account_number='1', bank_code='903')],
+    )
+    company.save()
+    company_id, version = company.id, company.version
+    path = write_ndjson(tmp_path / 'renamed.ndjson', [
+        company_record('company renaming a bank', bank_accounts=[
+            {'agency': '0001', 'account_number': '1', 'bank': {'code': '903', 'name': 'New Name'}},
+        ]),
+    ])
+
+    # When
+    result = runner.invoke(args=['import-companies', str(path)])
+
+    # Then
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    assert Bank.query.filter_by(code='903').one().name == 'New Name'
+    assert ClientCompany.current_version(company_id) == version + 1
@@ -0,0 +1,64 @@
+from src.database.cache import ResponseCache, bank_cache
+from src.database.models import Bank
+
+
+def test_bank_cache_get():
+    # When
+    bank = bank_cache.get('044')
+
+    # Then
+    assert bank == {'code': '044', 'name': 'Banco BVA'}
+
+
+def test_bank_cache_invalidated_on_save_and_delete():
+    # Given
+    bank = Bank(code='999', name='Banco Novo')
+
+    # When
+    bank.save()
+
+    # Then
+    assert bank_cache.get('999') == {'code': '999', 'name': 'Banco Novo'}
+
+    # When
+    bank.delete()
+
+    # Then
+    assert bank_cache.get('999') is None
+
+
+def test_bank_cache_get_without_queries(assert_num_queries):
+    # Given
+    bank_cache.load()
+
+    # When
+    with assert_num_queries(0):
+        bank = bank_cache.get('237')
+
+    # Then
+    assert bank['name'] == 'Banco Bradesco'
+
+
+def test_bank_cache_remembers_missing_codes(assert_num_queries):
+    # Given
+    bank_cache.load()
+
+    # When
+    with assert_num_queries(1):
+        first = bank_cache.get('000')
+        second = bank_cache.get('000')
+
+    # Then
+    assert first is None and second is None
+
+
+def test_response_cache_keeps_newer_version():
+    # Given
+    cache = ResponseCache('TEST')
+    cache.set(1, 'etag-2', b'new', 2)
+
+    # When
+    cache.set(1, 'etag-1', b'old', 1)
+
+    # Then
+    assert cache.get(1) == ('etag-2', b'new', 2)
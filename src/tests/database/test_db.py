@@ -0,0 +1,100 @@
+from decimal import Decimal
+
+import pytest
+
+from src import create_app
+from src.database.cache import company_cache
+from src.database.db import db, replica_router, use_replica
+from src.database.models import ClientCompany
+
+
+def insert_company(engine, name: str):
+    with engine.begin() as connection:
+        connection.execute(ClientCompany.__table__.insert(), {
+            'id': 1, 'company_name': name, 'phone': '11978235674', 'declared_billing': Decimal('10.00'),
+        })
+
+
+def build_replica_app(tmp_path, replica_uri: str, seed_replica: bool = True):
+    """
+    A primary and a replica SQLite file, the replica with an older name of the
+    same company, so where a read went is told by the name it got.
+    """
+    replica_app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/primary.db',
+        'SQLALCHEMY_BINDS': {'replica': replica_uri},
+        'SQLALCHEMY_REPLICA_BIND': 'replica',
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'TESTING': True,
+    })
+    # The session of this thread belongs to the tests app.
+    db.session.remove()
+    with replica_app.app_context():
+        db.create_all(bind=None)
+        insert_company(db.engine, 'name in the primary')
+        if seed_replica:
+            replica = db.get_engine(replica_app, bind='replica')
+            db.Model.metadata.create_all(replica)
+            insert_company(replica, 'name in the replica')
+
+    return replica_app
+
+
+@pytest.fixture
+def restore_app(app):
+    yield
+    db.session.remove()
+    replica_router.init_app(app)
+    company_cache.init_app(app)
+
+
+@pytest.fixture
+def replica_app(tmp_path, restore_app):
+    return build_replica_app(tmp_path, f'sqlite:///{tmp_path}/replica.db')
+
+
+def test_get_reads_from_replica(replica_app):
+    # When
+    response = replica_app.test_client().get('/company/1')
+
+    # Then
+    assert response.json['company_name'] == 'name in the replica'
+
+
+def test_reads_after_a_write_go_to_primary(replica_app):
+    with replica_app.test_request_context(method='GET'):
+        # Given
+        use_replica()
+        assert ClientCompany.query.get(1).company_name == 'name in the replica'
+
+        # When
+        db.session.execute(
+            ClientCompany.__table__.update().values(phone='11900000000').where(ClientCompany.id == 1)
+        )
+
+        # Then
+        db.session.expire_all()
+        assert ClientCompany.query.get(1).company_name == 'name in the primary'
+        db.session.rollback()
+
+
+def test_writes_go_to_primary(replica_app):
+    # When
+    response = replica_app.test_client().put('/company/1', json={'company_name': 'new name'})
+
+    # Then
+    assert response.status_code == 200
+    with replica_app.app_context():
+        assert ClientCompany.query.get(1).company_name == 'new name'
+        db.session.remove()
+
+
+def test_replica_down_reads_from_primary(tmp_path, restore_app):
+    # Given
+    replica_app = build_replica_app(tmp_path, 'sqlite:////nonexistent/replica.db', seed_replica=False)
+
+    # When
+    response = replica_app.test_client().get('/company/1')
+
+    # Then
+    assert response.json['company_name'] == 'name in the primary'
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from src.database.db import db
+from src.database.group_commit import GroupCommitter
+from src.database.models import ClientCompany
+
+
+def company_dict(name: str):
+    return {'company_name': name, 'phone': '11978235674', 'declared_billing': Decimal('10.00')}
+
+
+def add_company(name: str) -> int:
+    company = ClientCompany.add_from_dict(company_dict(name))
+    db.session.flush()
+    return company.id
+
+
+def fail():
+    db.session.add(ClientCompany(company_name='never created'))
+    raise ValueError('Invalid unit.')
+
+
+@pytest.fixture
+def commits(app):
+    counted = []
+
+    def count_commit(connection):
+        counted.append(connection)
+
+    event.listen(db.engine, 'commit', count_commit)
+    yield counted
+    event.remove(db.engine, 'commit', count_commit)
+
+
+def submit_concurrently(app, committer, units):
+    def submit(unit):
+        with app.app_context():
+            try:
+                return committer.submit(unit)
+            except ValueError as e:
+                return e
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=len(units)) as executor:
+        return list(executor.map(submit, units))
+
+
+def test_group_commit_disabled_commits_each_unit(commits):
+    # Given
+    committer = GroupCommitter(enabled=False)
+
+    # When
+    company_id = committer.submit(lambda: add_company('company committed alone'))
+
+    # Then
+    assert len(commits) == 1
+    assert ClientCompany.query.get(company_id).company_name == 'company committed alone'
+
+
+def test_group_commit_concurrent_units_in_one_commit(app, commits):
+    # Given
+    committer = GroupCommitter(enabled=True, window=5, max_batch=4)
+    units = [lambda i=i: add_company(f'grouped company {i}') for i in range(4)]
+
+    # When
+    ids = submit_concurrently(app, committer, units)
+
+    # Then
+    assert len(commits) == 1
+    assert ClientCompany.query.filter(ClientCompany.id.in_(ids)).count() == 4
+
+
+def test_group_commit_failed_unit_doesnt_fail_the_group(app, commits):
+    # Given
+    committer = GroupCommitter(enabled=True, window=5, max_batch=3)
+    units = [
+        lambda: add_company('grouped with a failure 1'),
+        fail,
+        lambda: add_company('grouped with a failure 2'),
+    ]
+
+    # When
+    results = submit_concurrently(app, committer, units)
+
+    # Then
+    assert len(commits) == 1
+    assert isinstance(results[1], ValueError)
+    assert ClientCompany.query.filter(ClientCompany.id.in_([results[0], results[2]])).count() == 2
+    assert ClientCompany.query.filter_by(company_name='never created').count() == 0
@@ -0,0 +1,151 @@
+from decimal import Decimal
+
+import pytest
+
+from src.database.db import db
+from src.database.models import Bank, BankBillingSummary, ClientCompany, CompanyBankAccount, CompanyChange
+
+
+@pytest.fixture
+def company_id():
+    company = ClientCompany(
+        company_name='company read by the ORM',
+        phone='11978235674',
+        declared_billing=Decimal('10.00'),
+        bank_accounts=[
+            CompanyBankAccount(agency='0001', account_number=str(i), bank_code='237')
+            for i in range(10)
+        ],
+    )
+    company.save()
+    return company.id
+
+
+@pytest.mark.parametrize(
+    'accounts_loading, expected_queries',
+    [
+        ('selectin', 2),
+        ('joined', 1),
+    ]
+)
+def test_get_for_read_query_count(
+    app, monkeypatch, assert_num_queries, company_id, accounts_loading, expected_queries
+):
+    """
+    The amount of queries to read a company must not grow with its bank accounts.
+    """
+    # Given
+    ClientCompany.query.session.expunge_all()
+    monkeypatch.setitem(app.config, 'BANK_ACCOUNTS_LOADING', accounts_loading)
+
+    # When
+    with app.test_request_context():
+        with assert_num_queries(expected_queries):
+            document = ClientCompany.get_for_read(company_id).serialize()
+
+    # Then
+    assert len(document['bank_accounts']) == 10
+
+
+def test_list_page(app, company_id):
+    # When
+    with app.test_request_context():
+        companies, next_cursor = ClientCompany.list_page(company_id - 1, limit=1)
+
+    # Then
+    assert [company.id for company in companies] == [company_id]
+
+
+def account(bank_code: str, account_number: str):
+    return {'agency': '0001', 'account_number': account_number, 'bank_code': bank_code}
+
+
+def company_id_named(name: str) -> int:
+    return db.session.execute(db.select(ClientCompany.id).where(ClientCompany.company_name == name)).scalar()
+
+
+def summary_rows():
+    rows = db.session.execute(db.select(
+        BankBillingSummary.bank_code, BankBillingSummary.company_count, BankBillingSummary.total_billing
+    ).where(BankBillingSummary.company_count > 0))
+    return {code: (count, Decimal(billing)) for code, count, billing in rows}
+
+
+def recomputed_rows():
+    return {
+        code: (count, Decimal(billing))
+        for code, count, billing in db.session.execute(BankBillingSummary.recompute_select())
+    }
+
+
+def test_billing_summary_incremental_matches_recompute(http_client):
+    # Given
+    BankBillingSummary.rebuild()
+    http_client.post('/company/', json={
+        'company_name': 'summarized company 1', 'phone': '11978235674', 'declared_billing': '100.50',
+        'bank_accounts': [account('237', '1'), account('237', '2')],
+    })
+    http_client.post('/company/', json={
+        'company_name': 'summarized company 2', 'phone': '11978235674', 'declared_billing': '20.00',
+        'bank_accounts': [account('044', '1')],
+    })
+    http_client.post('/company/bulk', json=[
+        {'company_name': 'summarized company 3', 'phone': '11978235674', 'declared_billing': '3.33',
+         'bank_accounts': [account('044', '2'), account('237', '3')]},
+    ])
+    first, second, third = (company_id_named(f'summarized company {i}') for i in range(1, 4))
+
+    # When
+    responses = [
+        http_client.put(f'/company/{first}', json={
+            'declared_billing': '150.00', 'bank_accounts': [account('044', '3')],
+        }),
+        http_client.post(f'/company/{second}/bank_account', json=account('237', '4')),
+        http_client.put(f'/company/{second}?sync_accounts=true', json={
+            'declared_billing': '25.00', 'bank_accounts': [account('237', '4')],
+        }),
+    ]
+    moved_id = db.session.execute(db.select(CompanyBankAccount.id).where(
+        CompanyBankAccount.company_id == first, CompanyBankAccount.account_number == '1'
+    )).scalar()
+    responses.append(http_client.put(f'/company/account/{moved_id}', json={'bank_code': '044'}))
+    removed_id = db.session.execute(db.select(CompanyBankAccount.id).where(
+        CompanyBankAccount.company_id == third, CompanyBankAccount.bank_code == '044'
+    )).scalar()
+    responses.append(http_client.delete(f'/company/account/{removed_id}'))
+    updated, recomputed = summary_rows(), recomputed_rows()
+    responses.append(http_client.delete(f'/company/{third}'))
+
+    # Then
+    assert [response.status_code for response in responses] == [200] * 6
+    assert updated == recomputed
+    assert summary_rows() == recomputed_rows() != recomputed
+
+
+def test_billing_summary_rebuild(app):
+    # Given
+    db.session.execute(db.update(BankBillingSummary.__table__).values(company_count=0, total_billing=0))
+    db.session.commit()
+
+    # When
+    BankBillingSummary.rebuild()
+
+    # Then
+    assert summary_rows() == recomputed_rows() != {}
+
+
+def test_bank_rename_records_changes_of_its_companies(company_id):
+    # Given
+    since = db.session.execute(db.select(db.func.max(CompanyChange.id))).scalar()
+    bank = Bank.query.filter_by(code='237').one()
+    name = bank.name
+
+    # When
+    bank.name = 'Renamed for the change feed'
+    bank.save()
+    bank.name = name
+    bank.save()
+
+    # Then
+    changes = CompanyChange.since(since, limit=10000)
+    assert [change['operation'] for change in changes if change['company_id'] == company_id] == ['update'] * 2
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError
+
+from src.database.pool import InstrumentedQueuePool, aggregate_worker_status, pool_status
+
+
+@pytest.fixture(autouse=True)
+def fake_now():
+    """
+    The pool timeout runs on the real clock, a frozen one never times out.
+    """
+    return None
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f'sqlite:///{tmp_path}/pool.db',
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.01,
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_pool_status_counts_checkouts(engine):
+    # When
+    for _ in range(3):
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+    # Then
+    status = pool_status(engine.pool)
+    assert status['class'] == 'InstrumentedQueuePool'
+    assert status['size'] == 1
+    assert status['checkouts'] == 3
+    assert status['checked_out'] == 0
+    assert status['checkout_seconds_max'] >= 0
+
+
+def test_pool_status_overflow_and_timeouts(engine):
+    # Given
+    first, second = engine.connect(), engine.connect()
+
+    # When
+    with pytest.raises(TimeoutError):
+        engine.connect()
+
+    # Then
+    status = pool_status(engine.pool)
+    assert status['checked_out'] == 2
+    assert status['overflow_max'] == 1
+    assert status['checkout_timeouts'] == 1
+
+    first.close()
+    second.close()
+
+
+def test_pool_status_keeps_counters_after_dispose(engine):
+    # Given
+    with engine.connect():
+        pass
+
+    # When
+    engine.dispose()
+
+    # Then
+    assert pool_status(engine.pool)['checkouts'] == 1
+
+
+def test_aggregate_worker_status():
+    # Given
+    statuses = [
+        {'pid': 1, 'pool': {'checkouts': 1, 'checked_out': 0, 'checked_in': 1, 'overflow_max': 0}},
+        {'pid': 2, 'pool': {'checkouts': 5, 'checked_out': 2, 'checked_in': 3, 'overflow_max': 1}},
+        {'pid': 1, 'pool': {'checkouts': 3, 'checked_out': 1, 'checked_in': 4, 'overflow_max': 2}},
+    ]
+
+    # When
+    aggregated = aggregate_worker_status(statuses)
+
+    # Then
+    assert aggregated['workers'] == 2
+    assert aggregated['checkouts'] == 8
+    assert aggregated['checked_out'] == 3
+    assert aggregated['connections'] == 10
+    assert aggregated['overflow_max'] == 2
@@ -0,0 +1,102 @@
+from decimal import Decimal
+
+from src.database.db import db
+from src.database.models import ClientCompany, CompanyBankAccount
+from src.database.projections import (
+    company_document, company_documents, company_documents_select, company_page,
+    export_company_documents, versioned_company_document
+)
+
+
+def create_company(name: str, accounts: int) -> ClientCompany:
+    company = ClientCompany(
+        company_name=name,
+        phone='11978235674',
+        declared_billing=Decimal('1235.69'),
+        bank_accounts=[
+            CompanyBankAccount(agency='0001', account_number=str(i), bank_code='237')
+            for i in range(accounts)
+        ],
+    )
+    company.save()
+    return company
+
+
+def test_company_document_same_as_serialize():
+    # Given
+    company = create_company('projected company', accounts=3)
+
+    # When
+    document = company_document(company.id)
+
+    # Then
+    assert document == ClientCompany.query.get(company.id).serialize()
+
+
+def test_company_document_without_accounts():
+    # Given
+    company = create_company('company without accounts', accounts=0)
+
+    # When
+    document = company_document(company.id)
+
+    # Then
+    assert document['bank_accounts'] == []
+    assert document == ClientCompany.query.get(company.id).serialize()
+
+
+def test_company_document_not_found():
+    assert company_document(999999) is None
+
+
+def test_company_page_same_as_serialize():
+    # Given
+    ids = [create_company(f'paged company {i}', accounts=i).id for i in range(3)]
+
+    # When
+    documents, next_cursor = company_page(cursor=ids[0] - 1, limit=3)
+
+    # Then
+    assert documents == [ClientCompany.query.get(_id).serialize() for _id in ids]
+
+
+def test_company_document_single_query(assert_num_queries):
+    # Given
+    company_id = create_company('single query company', accounts=3).id
+
+    # When
+    with assert_num_queries(1):
+        document = company_document(company_id)
+
+    # Then
+    assert [account['bank'] for account in document['bank_accounts']] == [
+        {'code': '237', 'name': 'Banco Bradesco'}
+    ] * 3
+
+
+def test_company_document_fields_without_accounts(assert_num_queries):
+    # Given
+    company_id = create_company('sparse company', accounts=3).id
+
+    # When
+    with assert_num_queries(1) as statements:
+        document, _ = versioned_company_document(
+            company_id, fields=('company_name', 'phone'), embed_accounts=False
+        )
+
+    # Then
+    assert document == {'company_name': 'sparse company', 'phone': '11978235674', 'id': company_id}
+    assert 'JOIN' not in statements[0]
+    assert 'declared_billing' not in statements[0]
+
+
+def test_export_company_documents_in_small_batches():
+    # Given
+    create_company('exported company', accounts=3)
+    expected = company_documents(db.session.execute(company_documents_select()))
+
+    # When
+    documents = list(export_company_documents(batch_size=2))
+
+    # Then
+    assert documents == expected
@@ -0,0 +1,152 @@
+from collections import Counter
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, select
+
+from src.database.models import Bank, ClientCompany, CompanyBankAccount
+from src.database.sharding import ShardRouter
+
+
+@pytest.fixture
+def router(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_SHARDS', {
+        f'shard_{i}': f'sqlite:///{tmp_path}/shard_{i}.db' for i in range(3)
+    })
+    monkeypatch.setitem(app.config, 'SHARD_ID_BLOCK_SIZE', 4)
+
+    router = ShardRouter()
+    router.init_app(app)
+    router.create_all()
+    router.save_bank('237', 'Banco Bradesco')
+
+    yield router
+
+    for engine in router.engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def company_ids(router):
+    session = router.session()
+    companies = [
+        ClientCompany(
+            company_name=f'sharded company {i}',
+            phone='11978235674',
+            declared_billing=Decimal('10.00'),
+            bank_accounts=[
+                CompanyBankAccount(agency='0001', account_number=str(j), bank_code='237') for j in range(2)
+            ],
+        )
+        for i in range(10)
+    ]
+    session.add_all(companies)
+    session.commit()
+
+    ids = [company.id for company in companies]
+    session.close()
+    return ids
+
+
+@pytest.fixture
+def statements(router):
+    counted = Counter()
+
+    def count_statement(name):
+        def count(*args):
+            counted[name] += 1
+        return count
+
+    listeners = [(engine, count_statement(name)) for name, engine in router.engines.items()]
+    for engine, listener in listeners:
+        event.listen(engine, 'before_cursor_execute', listener)
+    yield counted
+    for engine, listener in listeners:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+
+def test_new_ids_are_unique_and_of_their_shard(router):
+    # When
+    ids = [router.new_id() for _ in range(30)] + [router.new_id(shard_index=1) for _ in range(10)]
+
+    # Then
+    assert len(set(ids)) == 40
+    assert Counter(router.shard_for(_id) for _id in ids[:30]) == {'shard_0': 10, 'shard_1': 10, 'shard_2': 10}
+    assert {router.shard_for(_id) for _id in ids[30:]} == {'shard_1'}
+
+
+def test_companies_and_their_accounts_stored_in_their_shard(router, company_ids):
+    for company_id in company_ids:
+        shard = router.shard_for(company_id)
+        for name, engine in router.engines.items():
+            with engine.connect() as connection:
+                stored = connection.execute(
+                    select(CompanyBankAccount.id).where(CompanyBankAccount.company_id == company_id)
+                ).scalars().all()
+            assert len(stored) == (2 if name == shard else 0)
+            assert {router.shard_for(account_id) for account_id in stored} <= {shard}
+
+
+def test_get_company_reads_its_shard_only(router, company_ids, statements):
+    # Given
+    session = router.session()
+
+    # When
+    company = session.get(ClientCompany, company_ids[4])
+    accounts = company.bank_accounts
+
+    # Then
+    assert company.company_name == 'sharded company 4'
+    assert len(accounts) == 2
+    assert statements == {router.shard_for(company_ids[4]): 2}
+    session.close()
+
+
+def test_query_by_ids_reads_their_shards_only(router, company_ids, statements):
+    # Given
+    session = router.session()
+    ids = company_ids[:2]
+
+    # When
+    companies = session.query(ClientCompany).filter(ClientCompany.id.in_(ids)).all()
+
+    # Then
+    assert sorted(company.id for company in companies) == sorted(ids)
+    assert set(statements) == {router.shard_for(_id) for _id in ids}
+    session.close()
+
+
+def test_save_bank_replicated_to_every_shard(router, company_ids):
+    # When
+    router.save_bank('237', 'Renamed Bank')
+
+    # Then
+    for engine in router.engines.values():
+        with engine.connect() as connection:
+            assert connection.execute(select(Bank.name).where(Bank.code == '237')).scalar() == 'Renamed Bank'
+            assert set(connection.execute(select(ClientCompany.version)).scalars()) == {2}
+    assert router.banks.get('237') == {'code': '237', 'name': 'Renamed Bank'}
+
+
+def test_company_page_merges_every_shard(router, company_ids):
+    # When
+    pages, cursor = [], None
+    while True:
+        page, cursor = router.company_page(cursor, 4)
+        pages.append(page)
+        if cursor is None:
+            break
+
+    # Then
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert [document['id'] for page in pages for document in page] == sorted(company_ids)
+    assert pages[0][0]['bank_accounts'][0]['bank'] == {'code': '237', 'name': 'Banco Bradesco'}
+
+
+def test_company_page_search_every_shard(router, company_ids):
+    # When
+    page, cursor = router.company_page(None, 10, ClientCompany.search_criteria('sharded company 1'))
+
+    # Then
+    assert cursor is None
+    assert [document['id'] for document in page] == [company_ids[1]]
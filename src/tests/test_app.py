@@ -0,0 +1,29 @@
+from src import create_app
+from src.database.db import db, dispose_engine
+
+
+def test_create_app_from_dict_without_connecting():
+    """
+    Building the app must not touch the database, so it can be built before
+    forking the workers. The database here can't even be opened.
+    """
+    # When
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:////nonexistent/usercrud.db'})
+
+    # Then
+    assert 'user' in app.blueprints
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:////nonexistent/usercrud.db'
+
+
+def test_dispose_engine_drops_pooled_connections(app):
+    # Given
+    with app.app_context():
+        db.engine.connect().close()
+        pool = db.engine.pool
+
+    # When
+    dispose_engine(app)
+
+    # Then
+    with app.app_context():
+        assert db.engine.pool is not pool
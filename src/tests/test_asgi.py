@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('quart')
+
+
+def request(method: str, path: str, **kwargs):
+    from src.asgi import app
+
+    async def send():
+        async with app.test_app():
+            return await getattr(app.test_client(), method)(path, **kwargs)
+
+    return asyncio.run(send())
+
+
+def test_asgi_get_company_not_found(app):
+    # When
+    response = request('get', '/company/999999')
+
+    # Then
+    assert response.status_code == 404
+
+
+def test_asgi_create_company_invalid(app):
+    # When
+    response = request('post', '/company/', json={'phone': 'ak-47'})
+
+    # Then
+    assert response.status_code == 400
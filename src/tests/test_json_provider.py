@@ -0,0 +1,35 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+from src.json_provider import FastJSONProvider
+
+
+@pytest.mark.parametrize('company_name', ['my company', 'Itaú Unibanco'])
+def test_fast_json_provider_same_output_as_default(app, company_name):
+    # Given
+    document = {
+        'company_name': company_name,
+        'declared_billing': Decimal('1235.69'),
+        'created': datetime(2022, 8, 8, 12, 0, 0),
+        'bank_accounts': [{'bank': {'code': '044', 'name': 'Banco BVA'}, 'id': 1}],
+        'id': 1,
+    }
+
+    # When
+    with app.app_context():
+        fast = FastJSONProvider(app).response(document)
+        default = DefaultJSONProvider(app).response(document)
+
+    # Then
+    assert fast.get_data() == default.get_data()
+
+
+def test_fast_json_provider_loads(app):
+    # When
+    loaded = FastJSONProvider(app).loads(b'{"phone": "11978235674", "billing": 1.5}')
+
+    # Then
+    assert loaded == {'phone': '11978235674', 'billing': 1.5}
@@ -0,0 +1,119 @@
+import subprocess
+import sys
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+from src import create_app
+
+
+def client(app, **config):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        **config,
+    }).test_client()
+
+
+@pytest.fixture
+def metrics_client(app):
+    return client(app, METRICS_ENABLED=True)
+
+
+def sample(http_client, name: str, **labels) -> float:
+    """
+    The value of the sample with the given name and labels at /metrics, 0 when
+    it isn't there yet. Values are of the process, so tests compare them before
+    and after.
+    """
+    text = http_client.get('/metrics').get_data(as_text=True)
+    for family in text_string_to_metric_families(text):
+        for metric in family.samples:
+            if metric.name == name and labels.items() <= metric.labels.items():
+                return metric.value
+
+    return 0
+
+
+def test_requests_counted_by_route(metrics_client):
+    # Given
+    labels = {'method': 'GET', 'route': '/company/<int:company_id>'}
+    requests = sample(metrics_client, 'http_requests_total', status='404', **labels)
+    observed = sample(metrics_client, 'http_request_duration_seconds_count', **labels)
+
+    # When
+    metrics_client.get('/company/999999')
+    metrics_client.get('/company/999998')
+
+    # Then
+    assert sample(metrics_client, 'http_requests_total', status='404', **labels) == requests + 2
+    assert sample(metrics_client, 'http_request_duration_seconds_count', **labels) == observed + 2
+
+
+def test_statements_counted_by_route(metrics_client):
+    # Given
+    statements = sample(metrics_client, 'db_statements_total', route='/company/')
+
+    # When
+    metrics_client.get('/company/?limit=10')
+
+    # Then
+    assert sample(metrics_client, 'db_statements_total', route='/company/') == statements + 1
+
+
+def test_invalid_requests_counted_by_error(metrics_client):
+    # Given
+    labels = {'route': '/company/', 'error': 'InvalidRequestSchemaError'}
+    errors = sample(metrics_client, 'http_request_errors_total', **labels)
+
+    # When
+    response = metrics_client.post('/company/', json={'phone': 'not a phone'})
+
+    # Then
+    assert response.status_code == 400
+    assert b'String does not match expected pattern.' in response.data
+    assert sample(metrics_client, 'http_request_errors_total', **labels) == errors + 1
+
+
+def test_unknown_paths_share_a_route(metrics_client):
+    # When
+    metrics_client.get('/not/a/route/1')
+
+    # Then
+    text = metrics_client.get('/metrics').get_data(as_text=True)
+    assert 'route="<unmatched>"' in text
+    assert '/not/a/route' not in text
+
+
+def test_pool_gauges(metrics_client):
+    # When
+    metrics_client.get('/company/?limit=10')
+
+    # Then, the pool of the tests' SQLite holds no connections
+    text = metrics_client.get('/metrics').get_data(as_text=True)
+    assert 'db_pool_connections ' in text
+    assert 'db_pool_checked_out 0.0' in text
+
+
+def test_metrics_disabled(app):
+    # When
+    response = client(app, METRICS_ENABLED=False).get('/metrics')
+
+    # Then
+    assert response.status_code == 404
+
+
+def test_metrics_summed_across_processes(metrics_client, tmp_path, monkeypatch):
+    # Given, two workers writing to the directory
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    for _ in range(2):
+        subprocess.run([
+            sys.executable, '-c',
+            "from src.metrics import REQUESTS; REQUESTS.labels('GET', '/company/', '200').inc(3)",
+        ], check=True)
+
+    # When
+    value = sample(metrics_client, 'http_requests_total', method='GET', route='/company/', status='200')
+
+    # Then
+    assert value == 6
@@ -0,0 +1,55 @@
+import logging
+
+import pytest
+
+from src import create_app
+
+
+@pytest.fixture(autouse=True)
+def fake_now():
+    """
+    Timings run on the real clock, a frozen one measures nothing.
+    """
+    return None
+
+
+def client(app, **config):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        **config,
+    }).test_client()
+
+
+@pytest.fixture
+def profiled_client(app):
+    return client(app, PROFILING_ENABLED=True, SLOW_QUERY_SECONDS=0)
+
+
+def test_server_timing(profiled_client):
+    # When
+    response = profiled_client.get('/company/?limit=10')
+
+    # Then
+    metrics = [metric.split(';')[0] for metric in response.headers['Server-Timing'].split(', ')]
+    assert metrics == ['validation', 'db', 'serialization', 'total']
+    assert 'desc="1 statements"' in response.headers['Server-Timing']
+
+
+def test_server_timing_disabled(app):
+    # When
+    response = client(app, PROFILING_ENABLED=False).get('/company/?limit=10')
+
+    # Then
+    assert 'Server-Timing' not in response.headers
+
+
+def test_slow_query_log_redacts_parameters(profiled_client, caplog):
+    # When
+    with caplog.at_level(logging.WARNING):
+        profiled_client.get('/company/search?q=secret-term')
+
+    # Then
+    assert 'Slow query' in caplog.text
+    assert 'secret-term' not in caplog.text
+    assert '<redacted>' in caplog.text